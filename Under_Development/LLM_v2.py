@@ -1,9 +1,14 @@
-import ollama
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aadhar_masking_app"))
+from model_client import get_client  # Shared pooled Ollama client
+from encoding import ImageEncoder  # Same downsample/compress stage as the masking service
 from PIL import Image
-import base64
-import io
 from pdf2image import convert_from_path
 
+image_encoder = ImageEncoder()
+
+
 def document_to_base64(document_path):
     supported_formats = ('.pdf', '.jpeg', '.jpg', '.png', '.tiff', '.tif')
     if document_path.lower().endswith('.pdf'):
@@ -14,25 +19,22 @@ def document_to_base64(document_path):
         raise ValueError("Unsupported file format. Supported formats are: PDF, JPEG, JPG, PNG, TIFF.")
 
 def encode_pdf_to_base64(pdf_path):
-    images = convert_from_path(pdf_path)
     base64_encoded_images = []
 
-    for img in images:
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    for img in convert_from_path(pdf_path):
+        img_base64, _ = image_encoder.encode(img)
         base64_encoded_images.append(img_base64)
+        img.close()
 
     return base64_encoded_images
 
 def encode_image_to_base64(image_path):
     with Image.open(image_path) as img:
-        buffered = io.BytesIO()
-        img.save(buffered, format=img.format)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        img_base64, _ = image_encoder.encode(img)
+        return img_base64
 
 def extract_pan_details(base64_image):
-    response = ollama.chat(
+    response = get_client().chat(
         model="llama3.2-vision:latest",
         messages=[{
             "role": "user",
@@ -8,6 +8,10 @@ import pdf2image
 from PyPDF2 import PdfReader, PdfWriter, PdfMerger
 import tifftools
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aadhar_masking_app"))
+from regions import NumberRegionDetector
+import verhoeff
 
 class aadhar_text:
     def __init__(self, text):
@@ -97,110 +101,131 @@ class aadhar_text:
         return textlist
 
 class aadhar_fetch:
+    # Rotation codes passed on to Mask_UIDs, with the cv2 rotation that produces each variant
+    ROTATIONS = {
+        1: None,
+        2: cv2.ROTATE_90_COUNTERCLOCKWISE,
+        3: cv2.ROTATE_180,
+        4: cv2.ROTATE_90_CLOCKWISE,
+    }
+    # Tesseract OSD "rotate" (degrees clockwise to make the page upright) -> rotation code
+    OSD_ROTATIONS = {0: 1, 90: 4, 180: 3, 270: 2}
+    FLIPPED_ROTATIONS = {1: 3, 3: 1, 2: 4, 4: 2}
+    MAX_FRAMES = 25
+    TRIAGE_SIDE = 600  # Longest thumbnail side used to rank pages
+    TRIAGE_DPI = 40
+    MIN_OSD_CONFIDENCE = 2.0  # Tesseract's orientation_conf below which its answer is no better than a guess
 
-    def __init__(self, image_file_path):
+    def __init__(self, image_file_path, region_detector=None):
         self.image_file_path = image_file_path
-        self.multiplication_table = (
-            (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
-            (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
-            (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
-            (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
-            (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
-            (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
-            (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
-            (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
-            (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
-            (9, 8, 7, 6, 5, 4, 3, 2, 1, 0)
-        )
-        self.permutation_table = (
-            (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
-            (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
-            (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
-            (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
-            (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
-            (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
-            (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
-            (7, 0, 4, 6, 9, 1, 3, 2, 5, 8)
-        )
+        self.region_detector = region_detector or NumberRegionDetector()
 
     @staticmethod
     def find_text(text):
-        n = len(text)
-        if n < 12:
-            return 0
-        for i in range(14, n):
-            s = text[i - 14:i]
-            if s[4] == " " and s[9] == " ":
-                s = s.replace(" ", "")
-                n1 = len(s)
-                s1 = s[n1 - 12:n1]
-                if i == 125:
-                    pass
-                if s1.isnumeric() and len(s1) >= 12:
-                    return 1
-        return 0
+        """1 if `text` holds a dddd dddd dddd shaped run (OCR confusions allowed), else 0."""
+        return 1 if verhoeff.find_candidates(text) else 0
+
+    def ocr_text(self, array):
+        """OCR the candidate number regions first; fall back to the full frame if none holds a number."""
+        for x0, y0, x1, y1 in self.region_detector.propose(array):
+            text = pytesseract.image_to_string(array[y0:y1, x0:x1], config='--psm 6')
+            if self.find_text(text):
+                return text
+        return pytesseract.image_to_string(array)
+
+    def has_valid_uid(self, text):
+        """Whether `text` contains a number that passes the checksum, after OCR-confusion repair."""
+        return bool(verhoeff.find_valid_numbers([text])[0])
+
+    def rank_pages(self, thumbnails):
+        """Order page indexes by how likely each page is to carry an Aadhaar number, best first."""
+        scores = [self.region_detector.score(thumb) for thumb in thumbnails]
+        return sorted(range(len(scores)), key=lambda i: -scores[i])
+
+    @staticmethod
+    def frame_array(img):
+        """uint8 array for a PIL frame, scaling bilevel (boolean) frames to 0/255."""
+        array = np.array(img)
+        if array.dtype == bool:
+            array = array.astype(np.uint8) * 255
+        return array
 
     def addhar_check(self, file_name):
+        """Return the 1-based frame of `file_name` holding a valid Aadhaar number, or 0 if none does.
+
+        Frames are scored on small thumbnails first and fully OCR'd best-first, stopping at the
+        first frame whose number passes the checksum.
+        """
         img = Image.open(file_name)
-        u = 0
-        for i in range(25):
+        thumbnails = []
+        for i in range(self.MAX_FRAMES):
             try:
                 img.seek(i)
-                u = u + 1
-                array = np.array(img)
-                c = len(array.shape)
-                if c == 2:
-                    if array[0][0] == True or array[0][0] == False:
-                        array = array * 255
-                        img10 = array.astype(np.uint8)
-                        array = np.array(img10)
-
-                elif c == 3:
-                    if array[0][0][0] == True or array[0][0][0] == False:
-                        array = array * 255
-                        img10 = array.astype(np.uint8)
-                        array = np.array(img10)
-                text = pytesseract.image_to_string(array)
-                v = self.find_text(text)
-                if v:
-                    break
-                else:
-                    gaussianBlur = cv2.GaussianBlur(array, (5, 5), cv2.BORDER_DEFAULT)
-                    text = pytesseract.image_to_string(gaussianBlur)
-                    v = self.find_text(text)
-                    if v:
-                        break
-                    else:
-                        pass
             except EOFError:
-                u = 0
                 break
-        return u
+            thumb = img.convert("L")
+            thumb.thumbnail((self.TRIAGE_SIDE, self.TRIAGE_SIDE))
+            thumbnails.append(thumb)
+
+        for i in self.rank_pages(thumbnails):
+            img.seek(i)
+            array = self.frame_array(img)
+            if self.has_valid_uid(self.ocr_text(array)):
+                return i + 1
+            gaussianBlur = cv2.GaussianBlur(array, (5, 5), cv2.BORDER_DEFAULT)
+            if self.has_valid_uid(self.ocr_text(gaussianBlur)):
+                return i + 1
+        return 0
+
+    def estimate_orientation(self, gray):
+        """Return the rotation codes worth trying, most likely first.
+
+        Tesseract OSD gives the rotation directly; when it cannot (too little text) or is not
+        confident, a projection profile decides between upright/upside-down and sideways, leaving
+        two candidates.
+        """
+        try:
+            osd = pytesseract.image_to_osd(gray, output_type=pytesseract.Output.DICT)
+            if float(osd.get("orientation_conf", 0)) >= self.MIN_OSD_CONFIDENCE:
+                best = self.OSD_ROTATIONS.get(int(osd["rotate"]) % 360, 1)
+                return [best, self.FLIPPED_ROTATIONS[best]]
+        except pytesseract.TesseractError:
+            pass
+
+        # Text lines make the row profile of an upright page far spikier than its column profile
+        _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+        rows = binary.sum(axis=1, dtype=np.float64)
+        cols = binary.sum(axis=0, dtype=np.float64)
+        row_spread = rows.var() / (rows.mean() ** 2 + 1e-9)
+        col_spread = cols.var() / (cols.mean() ** 2 + 1e-9)
+        return [1, 3] if row_spread >= col_spread else [2, 4]
+
+    def rotate(self, gray, code):
+        return gray if self.ROTATIONS[code] is None else cv2.rotate(gray, self.ROTATIONS[code])
+
+    def iter_variants(self, gray):
+        """Lazily yield (image, rotation code): the two estimated orientations, then a blurred copy of the likelier one.
+
+        That caps an unreadable card at three Tesseract passes; the remaining rotations are not tried.
+        """
+        order = self.estimate_orientation(gray)
+        for code in order:
+            yield self.rotate(gray, code), code
+        yield cv2.GaussianBlur(self.rotate(gray, order[0]), (5, 5), 0), order[0]
 
     def Extract_and_Mask_UIDs(self, image_path):
         img = cv2.imread(self.image_processing(image_path=image_path))
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        rotations = [
-            [gray, 1],
-            [cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE), 2],
-            [cv2.rotate(gray, cv2.ROTATE_180), 3],
-            [cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE), 4],
-            [cv2.GaussianBlur(gray, (5, 5), 0), 1],
-            [cv2.GaussianBlur(cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE), (5, 5), 0), 2],
-            [cv2.GaussianBlur(cv2.rotate(gray, cv2.ROTATE_180), (5, 5), 0), 3],
-            [cv2.GaussianBlur(cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE), (5, 5), 0), 4]
-        ]
-        
+
         settings = ('-l eng --oem 3 --psm 11')
-        for rotation in rotations:
-            cv2.imwrite('rotated_grayscale.png', rotation[0])
-            bounding_boxes = pytesseract.image_to_boxes(Image.open('rotated_grayscale.png'), config=settings).split(" 0\n")
+        for variant, rotation in self.iter_variants(gray):
+            bounding_boxes = pytesseract.image_to_boxes(variant, config=settings).split(" 0\n")
             possible_UIDs = self.Regex_Search(bounding_boxes)
             if len(possible_UIDs) == 0:
                 continue
             else:
-                masked_img = self.Mask_UIDs(image_path, possible_UIDs, bounding_boxes, rotation[1])
-                aadhar_data = aadhar_text(pytesseract.image_to_string(Image.open('rotated_grayscale.png'), lang='eng')).adhaar_read_data()
+                masked_img = self.Mask_UIDs(image_path, possible_UIDs, bounding_boxes, rotation)
+                aadhar_data = aadhar_text(pytesseract.image_to_string(variant, lang='eng')).adhaar_read_data()
                 return masked_img, possible_UIDs, aadhar_data
 
         return None, None, None
@@ -210,10 +235,12 @@ class aadhar_fetch:
         k = 0
         masked_img = None
         if input_path.split('.')[-1] == "pdf":
-            pages = pdf2image.convert_from_path(input_path, 300)
-            for i in pages:
+            # Rank pages on low-DPI thumbnails and only render the promising ones at 300 DPI
+            thumbnails = pdf2image.convert_from_path(input_path, self.TRIAGE_DPI)
+            for page_index in self.rank_pages(thumbnails):
+                k = page_index + 1
+                i = pdf2image.convert_from_path(input_path, 300, first_page=k, last_page=k)[0]
                 i.save(input_path.split('/')[-1].split('.')[0] + ".jpg", 'JPEG')
-                k += 1
                 flag = self.addhar_check(input_path.split('/')[-1].split('.')[0] + ".jpg")
                 if flag != 0:
                     masked_img, possible_UIDs, aadhar_data = self.Extract_and_Mask_UIDs(input_path.split('/')[-1].split('.')[0] + ".jpg")
@@ -226,7 +253,6 @@ class aadhar_fetch:
                     print('Aadhar data:', aadhar_data)
                     self.merger(input_path, pdf_path, k - 1, 0)
                     os.remove('newfile.pdf')
-                    os.remove('rotated_grayscale.png')
                     os.remove(input_path.split('/')[-1].split('.')[0] + "_processed.jpg")
                     break
 
@@ -252,7 +278,6 @@ class aadhar_fetch:
             print('Aadhar data:', aadhar_data)
             self.merger(input_path, pdf_path, 0, 0)
             os.remove('newfile.pdf')
-            os.remove('rotated_grayscale.png')
             os.remove(input_path.split('/')[-1].split('.')[0] + "_processed.jpg")
 
     def merger(self, input_file, output_file, start_page, end_page):
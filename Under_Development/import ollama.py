@@ -1,11 +1,20 @@
-import ollama
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aadhar_masking_app"))
+from model_client import get_client  # Shared pooled Ollama client
+from encoding import ImageEncoder  # Same downsample/compress stage as the masking service
 from PIL import Image
-import base64
-import io
 from pdf2image import convert_from_path
-import os
-from tqdm.notebook import tqdm
+from tqdm.auto import tqdm
 import pandas as pd
+import csv
+import json
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+image_encoder = ImageEncoder()
 
 
 def document_to_base64(document_path):
@@ -15,22 +24,19 @@ def document_to_base64(document_path):
         return encode_image_to_base64(document_path)
 
 def encode_pdf_to_base64(pdf_path):
-    images = convert_from_path(pdf_path)
     base64_encoded_images = []
 
-    for img in images:
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    for img in convert_from_path(pdf_path):
+        img_base64, _ = image_encoder.encode(img)
         base64_encoded_images.append(img_base64)
+        img.close()
 
     return base64_encoded_images
 
 def encode_image_to_base64(image_path):
     with Image.open(image_path) as img:
-        buffered = io.BytesIO()
-        img.save(buffered, format=img.format)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        img_base64, _ = image_encoder.encode(img)
+        return img_base64
 
 def extract_pan_details(base64_image):
     """
@@ -42,7 +48,7 @@ def extract_pan_details(base64_image):
     Returns:
         dict: A dictionary containing the PAN card details.
     """
-    response = ollama.chat(
+    response = get_client().chat(
         model="llama3.2-vision:latest",
         messages=[{
             "role": "user",
@@ -72,24 +78,164 @@ def extract_pan_details(base64_image):
 #     print(pan_dict)
 
 
-def process_pan_documents(pan_path, output_file='pan_extracts.xlsx'):
-    pan_list = [i for i in os.listdir(pan_path) if not i.startswith('.')]
-    results = []
-    
-    for file in tqdm(pan_list, desc='Processing PAN files'):
-        file_path = os.path.join(pan_path, file)
-        base64_image = document_to_base64(file_path)
-        pan_dict = extract_pan_details(base64_image)
-        pan_dict['file_name'] = file 
-        results.append(pan_dict)
-    
-    # Convert list of dictionaries to a DataFrame and save to Excel
-    df = pd.DataFrame(results)
-    df.to_excel(output_file, index=False)
+OUTPUT_COLUMNS = ["file_name", "Name", "Father's Name", "PAN NO", "DOB", "status", "error"]
+
+
+def process_pan_file(pan_path, file):
+    """Extract one PAN file into an output row; failures are captured in the row instead of raised."""
+    row = {"file_name": file, "status": "ok", "error": ""}
+    try:
+        pages = document_to_base64(os.path.join(pan_path, file))
+        if isinstance(pages, str):
+            pages = [pages]
+        last_error = None
+        for base64_image in pages:  # PDFs: use the first page that parses as a PAN card
+            try:
+                row.update(extract_pan_details(base64_image))
+                return row
+            except (IndexError, KeyError) as e:
+                last_error = e
+        raise ValueError(f"Unparseable model response: {last_error}")
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+        return row
+
+
+class CsvRowWriter:
+    """Appends rows to a CSV file as they arrive, so an interrupted run keeps everything written so far."""
+
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="", encoding="utf-8")
+        self.writer = csv.DictWriter(self.file, fieldnames=OUTPUT_COLUMNS, extrasaction="ignore")
+        if new_file:
+            self.writer.writeheader()
+
+    def write(self, row):
+        self.writer.writerow(row)
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetRowWriter:
+    """Writes rows as Parquet row groups of `batch_size`; each run writes its own part file next to `path`."""
+
+    def __init__(self, path, batch_size=500):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self.pa = pa
+        self.schema = pa.schema([(column, pa.string()) for column in OUTPUT_COLUMNS])
+        base, ext = os.path.splitext(path)
+        part_path = f"{base}.part-{datetime.now().strftime('%Y%m%d_%H%M%S')}{ext or '.parquet'}"
+        self.writer = pq.ParquetWriter(part_path, self.schema)
+        self.batch_size = batch_size
+        self.rows = []
+
+    def write(self, row):
+        self.rows.append({column: str(row.get(column, "")) for column in OUTPUT_COLUMNS})
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.write_table(self.pa.Table.from_pylist(self.rows, schema=self.schema))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+
+
+def load_manifest(manifest_file, retry_errors=False):
+    """File names already handled by earlier runs (errors excluded when retrying them)."""
+    done = set()
+    if not os.path.exists(manifest_file):
+        return done
+    with open(manifest_file, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # A run killed mid-write can leave a partial last line
+            if entry["status"] == "ok" or not retry_errors:
+                done.add(entry["file_name"])
+            else:
+                done.discard(entry["file_name"])
+    return done
+
+
+def read_output(output_file, output_format):
+    """Load everything written to the streaming output (all Parquet part files for parquet), one row per file.
+
+    Retried files and rows written again after a crash appear more than once; the latest row wins.
+    """
+    if output_format == "parquet":
+        base, ext = os.path.splitext(output_file)
+        folder = os.path.dirname(base) or "."
+        prefix = os.path.basename(base) + ".part-"
+        parts = sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.startswith(prefix))
+        if not parts:
+            return pd.DataFrame()
+        df = pd.concat([pd.read_parquet(part) for part in parts], ignore_index=True)
+    else:
+        df = pd.read_csv(output_file, dtype=str, keep_default_na=False)
+    return df.drop_duplicates(subset="file_name", keep="last").reset_index(drop=True)
+
+
+def process_pan_documents(pan_path, output_file='pan_extracts.csv', workers=4, manifest_file=None,
+                          output_format=None, excel_file=None, retry_errors=False):
+    """Extract every PAN file in `pan_path` in parallel, streaming rows to CSV/Parquet as they finish.
+
+    A manifest (JSON lines, one per processed file) lets an interrupted run resume where it stopped.
+    For backwards compatibility an `.xlsx` output_file streams to a CSV beside it and exports to
+    Excel at the end. Returns the full output as a DataFrame.
+    """
+    if output_file.lower().endswith('.xlsx'):
+        excel_file = excel_file or output_file
+        output_file = os.path.splitext(output_file)[0] + '.csv'
+    output_format = output_format or ('parquet' if output_file.lower().endswith('.parquet') else 'csv')
+    manifest_file = manifest_file or output_file + '.manifest'
+
+    done = load_manifest(manifest_file, retry_errors)
+    pan_list = [i for i in sorted(os.listdir(pan_path)) if not i.startswith('.') and i not in done]
+
+    writer = ParquetRowWriter(output_file) if output_format == 'parquet' else CsvRowWriter(output_file)
+    try:
+        with open(manifest_file, 'a', encoding='utf-8') as manifest, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(process_pan_file, pan_path, file) for file in pan_list]
+            for future in tqdm(as_completed(futures), total=len(futures), desc='Processing PAN files'):
+                row = future.result()
+                writer.write(row)
+                manifest.write(json.dumps({"file_name": row["file_name"], "status": row["status"]}) + "\n")
+                manifest.flush()
+    finally:
+        writer.close()
+
+    df = read_output(output_file, output_format)
+    if excel_file:
+        df.to_excel(excel_file, index=False)
     return df
 
-if __name__ == "__main__":
-    pan_path = 'D:/Details/Pan/'  
-    df = process_pan_documents(pan_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk PAN card extraction with resumable, streaming output.")
+    parser.add_argument("pan_path", help="Directory of PAN images/PDFs")
+    parser.add_argument("--output", default="pan_extracts.csv", help="Streaming output file (.csv or .parquet)")
+    parser.add_argument("--format", choices=["csv", "parquet"], help="Output format (default: from --output)")
+    parser.add_argument("--workers", type=int, default=4, help="Files processed in parallel")
+    parser.add_argument("--manifest", help="Checkpoint manifest (default: <output>.manifest)")
+    parser.add_argument("--excel", help="Also export all rows to this .xlsx at the end")
+    parser.add_argument("--retry-errors", action="store_true", help="Re-process files that failed in earlier runs")
+    args = parser.parse_args()
+
+    df = process_pan_documents(args.pan_path, output_file=args.output, workers=args.workers,
+                               manifest_file=args.manifest, output_format=args.format,
+                               excel_file=args.excel, retry_errors=args.retry_errors)
     print(df.head())
 
+
+if __name__ == "__main__":
+    main()
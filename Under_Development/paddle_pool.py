@@ -0,0 +1,196 @@
+import os
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import cv2
+import numpy as np
+
+
+DROP_SCORE = 0.5  # PaddleOCR's default: recognised lines below this score are discarded
+
+_engine = None
+
+
+def _init_worker(engine_factory=None):
+    """Load this worker's engine once, when the process starts."""
+    global _engine
+    if engine_factory is None:
+        from pan_lic_vi import get_ocr
+        engine_factory = get_ocr
+    _engine = engine_factory()
+
+
+def _crop(page, box):
+    """Perspective-crop one detected text box, upright, like PaddleOCR does before recognition."""
+    points = np.array(box, dtype=np.float32)
+    width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+    height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    crop = cv2.warpPerspective(
+        page, cv2.getPerspectiveTransform(points, target), (max(width, 1), max(height, 1)),
+        borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC,
+    )
+    if crop.shape[0] >= crop.shape[1] * 1.5:
+        crop = np.rot90(crop)
+    return crop
+
+
+def _ocr_batch(pages: list) -> list:
+    """OCR a micro-batch of pages in this worker; one PaddleOCR-format result per page.
+
+    Detection runs page by page, then the text boxes of every page in the batch go through the
+    angle classifier and recogniser together, so those run on full batches instead of a handful
+    of lines per page. Engines without PaddleOCR's `det`/`rec` switches are called per page.
+    """
+    if not hasattr(_engine, "text_recognizer"):
+        return [_engine.ocr(page) for page in pages]
+
+    boxes = []
+    crops = []
+    for page_no, page in enumerate(pages):
+        detected = (_engine.ocr(page, rec=False) or [None])[0] or []
+        for box in sorted(detected, key=lambda b: (b[0][1], b[0][0])):  # Reading order
+            boxes.append((page_no, box))
+            crops.append(_crop(page, box))
+
+    results = [[[]] for _ in pages]
+    if crops:
+        recognised = _engine.ocr([crops], det=False, cls=True)[0]  # A nested list is one batch
+        for (page_no, box), (text, score) in zip(boxes, recognised):
+            if score >= DROP_SCORE:
+                results[page_no][0].append([box, (text, score)])
+    return results
+
+
+class PaddleEnginePool:
+    """Worker processes that each hold one loaded PaddleOCR, fed with micro-batches of pages.
+
+    `submit(page)` returns a Future of the page's PaddleOCR result. A dispatcher thread groups pages
+    submitted from any number of documents into batches of up to `batch_size`, waiting at most
+    `max_wait` seconds for a batch to fill once a worker is free, and hands each batch to a worker.
+    The pool has PaddleOCR's `.ocr(page)` method, so it can be passed as `DocumentExtractor(ocr=pool)`.
+    `engine_factory` must be picklable; by default each worker uses `pan_lic_vi.get_ocr`.
+    """
+
+    def __init__(self, workers: int = None, batch_size: int = None, max_wait: float = None, engine_factory=None):
+        self.workers = workers or int(os.getenv("PADDLE_WORKERS", "0")) or os.cpu_count() or 1
+        self.batch_size = batch_size or int(os.getenv("PADDLE_BATCH_SIZE", "8"))
+        self.max_wait = max_wait if max_wait is not None else float(os.getenv("PADDLE_BATCH_WAIT", "0.05"))
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_init_worker, initargs=(engine_factory,)
+        )
+        self._free = threading.Semaphore(self.workers)  # One batch per worker; the rest wait here and batch up
+        self._queue = queue.Queue()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="paddle-dispatch", daemon=True)
+        self._dispatcher.start()
+
+    def submit(self, page) -> Future:
+        """Queue one BGR page array for OCR."""
+        future = Future()
+        # Copy now: callers often pass views (e.g. over a pixmap) that are gone before dispatch
+        self._queue.put((np.ascontiguousarray(page), future))
+        return future
+
+    def ocr(self, page, **kwargs):
+        """Blocking, PaddleOCR-compatible call."""
+        return self.submit(page).result()
+
+    def map(self, pages) -> list:
+        """OCR many pages at once; results in input order."""
+        return [future.result() for future in [self.submit(page) for page in pages]]
+
+    def _dispatch(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._free.acquire()
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)  # Dispatch what we have, then stop on the next round
+                    break
+                batch.append(item)
+            try:
+                future = self._executor.submit(_ocr_batch, [page for page, _ in batch])
+            except Exception as e:
+                self._free.release()
+                self._deliver(batch, None, error=e)
+                continue
+            future.add_done_callback(partial(self._done, batch))
+
+    def _done(self, batch, future):
+        self._free.release()
+        try:
+            results = future.result()
+        except Exception as e:
+            self._deliver(batch, None, error=e)
+            return
+        self._deliver(batch, results)
+
+    @staticmethod
+    def _deliver(batch, results, error=None):
+        for i, (_, future) in enumerate(batch):
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(results[i])
+
+    def close(self):
+        self._queue.put(None)
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def extract_bulk(file_paths: list, pool: PaddleEnginePool, concurrency: int = None) -> dict:
+    """Run DocumentExtractor.extract_all over many files sharing one pool; returns {path: numbers}.
+
+    Documents are processed on `concurrency` threads (enough by default to fill every worker's
+    batch), so their pages meet in the same micro-batches.
+    """
+    from pan_lic_vi import DocumentExtractor
+
+    concurrency = concurrency or pool.workers * pool.batch_size
+
+    def extract(path):
+        try:
+            return DocumentExtractor(path, ocr=pool).extract_all()
+        except Exception as e:
+            return {"error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return dict(zip(file_paths, executor.map(extract, file_paths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract DL/PAN/EPIC numbers from many files on a PaddleOCR pool.")
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--max-wait", type=float, default=None, help="Seconds to wait for a batch to fill")
+    parser.add_argument("--concurrency", type=int, default=None, help="Documents processed at once")
+    args = parser.parse_args()
+
+    with PaddleEnginePool(args.workers, args.batch_size, args.max_wait) as pool:
+        json.dump(extract_bulk(args.files, pool, args.concurrency), sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,49 @@
-import ollama
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aadhar_masking_app"))
+from model_client import get_client  # Shared pooled Ollama client
+from encoding import ImageEncoder  # Same downsample/compress stage as the masking service
+from cache import OCRCache  # Content-addressed result cache shared with the masking service
 from PIL import Image
 import base64
 import io
-from pdf2image import convert_from_path
+from pdf2image import convert_from_path, convert_from_bytes
 import json
 from datetime import datetime
 import plotly.graph_objects as go
 import dash
-from dash import dcc, html
+from dash import dcc, html, DiskcacheManager, CeleryManager
 from dash.dependencies import Input, Output, State
 
 
+MODEL = "llama3.2-vision:latest"
+PROMPT = "The image is an Indian PAN Card. Output should be in this format - <Name of the PAN Card Holder>, <Father's Name>, <PAN Number>, <Date of Birth>. Do not output anything else."
+PASSTHROUGH_FORMATS = ("JPEG", "PNG")  # Uploads the model can take as they are
+RESULTS_LOG = os.getenv("PAN_RESULTS_LOG", "pan_details.jsonl")
+
+image_encoder = ImageEncoder()
+
+# Background callbacks run outside the Dash request threads: on Celery workers when REDIS_URL is
+# set (a worker pool shared by every operator), otherwise in local processes tracked by diskcache.
+if "REDIS_URL" in os.environ:
+    from celery import Celery
+    celery_app = Celery(__name__, broker=os.environ["REDIS_URL"], backend=os.environ["REDIS_URL"])
+    background_callback_manager = CeleryManager(celery_app)
+else:
+    import diskcache
+    background_callback_manager = DiskcacheManager(diskcache.Cache(os.getenv("PAN_CALLBACK_CACHE", "./cache")))
+
+_result_cache = None
+
+
+def get_result_cache():
+    """Per-process OCRCache over one SQLite file, so every worker sees every stored result."""
+    global _result_cache
+    if _result_cache is None:
+        _result_cache = OCRCache(max_entries=64, db_path=os.getenv("PAN_CACHE_DB", "pan_cache.db"))
+    return _result_cache
+
+
 def document_to_base64(document_path):
     if document_path.lower().endswith('.pdf'):
         return encode_pdf_to_base64(document_path)
@@ -19,33 +52,49 @@ def document_to_base64(document_path):
 
 
 def encode_pdf_to_base64(pdf_path):
-    images = convert_from_path(pdf_path)
     base64_encoded_images = []
 
-    for img in images:
-        buffered = io.BytesIO()
-        img.save(buffered, format="JPEG")
-        img_base64 = base64.b64encode(buffered.getvalue()).decode('utf-8')
+    for img in convert_from_path(pdf_path):
+        img_base64, _ = image_encoder.encode(img)
         base64_encoded_images.append(img_base64)
+        img.close()
 
     return base64_encoded_images
 
 
 def encode_image_to_base64(image_path):
     with Image.open(image_path) as img:
-        buffered = io.BytesIO()
-        img.save(buffered, format=img.format)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        img_base64, _ = image_encoder.encode(img)
+        return img_base64
+
+
+def upload_to_images(decoded, filename):
+    """Base64 images to send for an upload: one per PDF page, or the image itself.
+
+    JPEG/PNG uploads already within the encoder's size limit are passed through untouched; other
+    images (other formats, RGBA that JPEG cannot hold, oversized scans) go through the encoder.
+    """
+    if filename.lower().endswith('.pdf'):
+        images = []
+        for img in convert_from_bytes(decoded):
+            images.append(image_encoder.encode(img)[0])
+            img.close()
+        return images
+
+    with Image.open(io.BytesIO(decoded)) as img:
+        if img.format in PASSTHROUGH_FORMATS and max(img.size) <= image_encoder.max_side:
+            return [base64.b64encode(decoded).decode('utf-8')]
+        return [image_encoder.encode(img)[0]]
 
 
 def extract_pan_details(base64_image):
 
     try:
-        response = ollama.chat(
-            model="llama3.2-vision:latest",
+        response = get_client().chat(
+            model=MODEL,
             messages=[{
                 "role": "user",
-                "content": "The image is an Indian PAN Card. Output should be in this format - <Name of the PAN Card Holder>, <Father's Name>, <PAN Number>, <Date of Birth>. Do not output anything else.",
+                "content": PROMPT,
                 "images": [base64_image]
             }],
         )
@@ -68,20 +117,44 @@ def extract_pan_details(base64_image):
         return None
 
 
-def save_json_response(pan_dict):
-    """Saves the PAN details to a JSON file with a timestamp."""
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"pan_details_{timestamp}.json"
+def save_json_response(pan_dict, filename=None):
+    """Appends the PAN details, with a timestamp and the source file name, to the RESULTS_LOG JSON Lines file."""
+    record = {"timestamp": datetime.now().isoformat(timespec="seconds"), "file": filename, **pan_dict}
     try:
-        with open(filename, 'w') as f:
-            json.dump(pan_dict, f, indent=4)
-        print(f"PAN details saved to {filename}")
+        with open(RESULTS_LOG, 'a') as f:
+            f.write(json.dumps(record) + "\n")
     except Exception as e:
         print(f"Error saving JSON response: {e}")
 
 
+def extract_document(decoded, filename, set_progress=None):
+    """PAN details for every page of an upload, cached by the content hash of the uploaded bytes.
+
+    Returns (pages, cached): one details dict (or None) per page, and whether they came from the cache.
+    """
+    cache = get_result_cache()
+    cache_key = cache.make_key(decoded, MODEL, PROMPT)
+    pages = cache.get(cache_key)
+    if pages is not None:
+        return pages, True
+
+    images = upload_to_images(decoded, filename)
+    pages = []
+    for page_no, image in enumerate(images, start=1):
+        if set_progress is not None:
+            set_progress((str(page_no - 1), str(len(images)), f"Extracting page {page_no} of {len(images)}..."))
+        pan_dict = extract_pan_details(image)
+        if pan_dict:
+            save_json_response(pan_dict, filename)
+        pages.append(pan_dict)
+    # Failed extractions are not cached, so a retry goes back to the model
+    if any(pages):
+        cache.set(cache_key, pages)
+    return pages, False
+
+
 # Dash app
-app = dash.Dash(__name__)
+app = dash.Dash(__name__, background_callback_manager=background_callback_manager)
 
 app.layout = html.Div([
     html.H1("PAN Card Information Extractor"),
@@ -104,18 +177,32 @@ app.layout = html.Div([
         multiple=False  # Allow only one file to be uploaded
     ),
     html.Div(id='output-image-upload'),
+    html.H6("Extracted Details:"),
+    html.Progress(id='extract-progress', value='0', max='1', style={'width': '50%', 'visibility': 'hidden'}),
+    html.Div(id='extract-status'),
     html.Div(id='output-pan-details'),
 ])
 
 
 def parse_contents(contents, filename):
     """Parses the uploaded file content and displays the image."""
+    preview = html.P("PDF uploaded") if filename.lower().endswith('.pdf') else html.Img(src=contents, style={'width': '50%'})
     return html.Div([
         html.H5(filename),
-        html.Img(src=contents, style={'width': '50%'}),
+        preview,
         html.Hr(),
-        html.H6("Extracted Details:"),
-        html.Div(id='pan-details-output'),  # Placeholder for PAN details
+    ])
+
+
+def render_details(pan_dict):
+    if not pan_dict:
+        return html.P("Could not extract PAN details. Please ensure the image is clear and try again.")
+    fathers_name = pan_dict["Father's Name"]  # Python < 3.12 f-strings cannot hold the quote/backslash
+    return html.Div([
+        html.P(f"Name: {pan_dict['Name']}"),
+        html.P(f"Father's Name: {fathers_name}"),
+        html.P(f"PAN NO: {pan_dict['PAN NO']}"),
+        html.P(f"DOB: {pan_dict['DOB']}")
     ])
 
 
@@ -130,43 +217,38 @@ def update_output(contents, filename):
 
 
 @app.callback(
-    Output('pan-details-output', 'children'),
-    [Input('upload-image', 'contents')]
+    Output('output-pan-details', 'children'),
+    Input('upload-image', 'contents'),
+    State('upload-image', 'filename'),
+    background=True,
+    running=[
+        (Output('upload-image', 'disabled'), True, False),
+        (Output('extract-progress', 'style'), {'width': '50%', 'visibility': 'visible'},
+         {'width': '50%', 'visibility': 'hidden'}),
+    ],
+    progress=[Output('extract-progress', 'value'), Output('extract-progress', 'max'), Output('extract-status', 'children')],
+    prevent_initial_call=True,
 )
-def display_pan_details(contents):
-    """Extracts and displays PAN card details."""
-    if contents is not None:
-        try:
-            # Extract the data and the filename from the contents
-            content_type, content_string = contents.split(',')
-            # Decode the image
-            decoded = base64.b64decode(content_string)
-            image = Image.open(io.BytesIO(decoded))
-            # Convert the image to base64
-            buffered = io.BytesIO()
-            image.save(buffered, format="JPEG")  # Change format if needed
-            img_str = base64.b64encode(buffered.getvalue()).decode('utf-8')
-
-            pan_dict = extract_pan_details(img_str)
-
-            if pan_dict:
-                save_json_response(pan_dict)
-                return html.Div([
-                    html.P(f"Name: {pan_dict['Name']}"),
-                    html.P(f"Father's Name: {pan_dict['Father\'s Name']}"),
-                    html.P(f"PAN NO: {pan_dict['PAN NO']}"),
-                    html.P(f"DOB: {pan_dict['DOB']}")
-                ])
-            else:
-                return html.Div([
-                    html.P("Could not extract PAN details. Please ensure the image is clear and try again.")
-                ])
-        except Exception as e:
-            print(e)
-            return html.Div([
-                html.P("There was an error processing the file.")
-            ])
-    return ''
+def display_pan_details(set_progress, contents, filename):
+    """Extracts and displays PAN card details, in a background worker so the UI stays responsive."""
+    if contents is None:
+        return ''
+    try:
+        # The upload is a data URL; its payload is the file's bytes, used as they are
+        content_type, content_string = contents.split(',', 1)
+        decoded = base64.b64decode(content_string)
+        pages, cached = extract_document(decoded, filename or '', set_progress)
+        set_progress(('1', '1', "Loaded from cache" if cached else "Done"))
+        if len(pages) == 1:
+            return render_details(pages[0])
+        return html.Div([html.Div([html.H6(f"Page {page_no}"), render_details(pan_dict)])
+                         for page_no, pan_dict in enumerate(pages, start=1)])
+    except Exception as e:
+        print(e)
+        set_progress(('0', '1', ''))
+        return html.Div([
+            html.P("There was an error processing the file.")
+        ])
 
 
 if __name__ == '__main__':
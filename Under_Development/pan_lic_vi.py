@@ -1,44 +1,101 @@
-from paddleocr import PaddleOCR
+import os
+import sys
 import re
+import cv2
 import fitz  # PyMuPDF
+import numpy as np
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "aadhar_masking_app"))
+from paddle_engine import get_paddle_ocr as get_ocr  # One PaddleOCR per thread, shared with the masking service
 
 class DocumentExtractor:
-    def __init__(self, file_path):
+    DL_PATTERN = r"^[A-Z]{2}[0-9]{14}|^[A-Z]{2}[0-9]{13}"
+    PAN_PATTERN = r"^[A-Z0-9]{5}[0-9]{4}[A-Z0-9]{1}"
+    EPIC_PATTERN = r"^[A-Za-z]{3}\d{7}$"
+    CACHE_MODEL = "paddleocr-en"
+    CACHE_PROMPT = "use_angle_cls=True"
+
+    def __init__(self, file_path, cache=None, region_detector=None, ocr=None):
         self.file_path = file_path
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
+        self.ocr = ocr or get_ocr()  # Any object with PaddleOCR's .ocr(); shared per process by default
+        self.cache = cache  # Optional OCRCache (aadhar_masking_app/cache.py) shared with other engines
+        self.region_detector = region_detector  # Optional NumberRegionDetector to crop before OCR
+        self.ocr_results = None  # One PaddleOCR result per page, filled on first use
+        self.patterns = {}
+        self.register_pattern("dl", self.DL_PATTERN)
+        self.register_pattern("pan", self.PAN_PATTERN, correction=self.pan_correction)
+        self.register_pattern("epic", self.EPIC_PATTERN)
+
+    def register_pattern(self, name, pattern, correction=None):
+        """Register a regex (and optional per-match correction) to run in extract_all."""
+        self.patterns[name] = (pattern, correction)
 
     def extract_dl_numbers(self):
         """Extract Driving License numbers from the specified file."""
-        return self._extract_numbers(r"^[A-Z]{2}[0-9]{14}|^[A-Z]{2}[0-9]{13}")
+        return self._extract_numbers(*self.patterns["dl"])
 
     def extract_pan_numbers(self):
         """Extract PAN numbers from the specified file."""
-        return self._extract_numbers(r"^[A-Z0-9]{5}[0-9]{4}[A-Z0-9]{1}", pan_correction=True)
+        return self._extract_numbers(*self.patterns["pan"])
 
     def extract_epic_numbers(self):
         """Extract EPIC numbers from the specified file."""
-        return self._extract_numbers(r"^[A-Za-z]{3}\d{7}$")
+        return self._extract_numbers(*self.patterns["epic"])
 
-    def _extract_numbers(self, pattern, pan_correction=False):
-        """Generic method to extract numbers based on a regex pattern."""
-        filtered_numbers = []
-        filename = self.file_path
+    def extract_all(self):
+        """Run every registered pattern against a single OCR pass of the file."""
+        return {name: self._extract_numbers(pattern, correction)
+                for name, (pattern, correction) in self.patterns.items()}
+
+    def run_ocr(self):
+        """OCR every page of the file once and keep the line results on the instance."""
+        if self.ocr_results is not None:
+            return self.ocr_results
 
+        filename = self.file_path
         if filename.lower().endswith(('.jpg', '.png', '.jpeg')):
-            result = self.ocr.ocr(filename)
-            filtered_numbers = self._process_ocr_result(result, pattern)
+            self.ocr_results = [self._ocr_page(cv2.imread(filename))]
         else:
-            pages = self._convert_pdf_to_images(filename)
-            for i, page in enumerate(pages):
-                temp_filename = f"{filename.split('/')[-1].split('.')[0]}_temp_{i}.jpg"
-                page.save(temp_filename, 'JPEG')
-                result = self.ocr.ocr(temp_filename)
-                filtered_numbers.extend(self._process_ocr_result(result, pattern))
+            self.ocr_results = [self._ocr_page(page) for page in self._iter_pdf_pages(filename)]
+        return self.ocr_results
+
+    def _ocr_page(self, page):
+        """OCR one BGR page array, going through the shared result cache when one is set."""
+        if self.cache is None:
+            return self._recognize(page)
+
+        digest_input = np.ascontiguousarray(page)
+        pixels = f"{digest_input.shape}:".encode() + digest_input.tobytes()
+        prompt = self.CACHE_PROMPT + ("|regions" if self.region_detector is not None else "")
+        cache_key = self.cache.make_key(pixels, self.CACHE_MODEL, prompt)
+        result = self.cache.get(cache_key)
+        if result is None:
+            result = self._recognize(page)
+            self.cache.set(cache_key, result)
+        return result
+
+    def _recognize(self, page):
+        """Run PaddleOCR on candidate number regions first, and on the full page if no pattern matches there."""
+        if self.region_detector is not None:
+            lines = []
+            for x0, y0, x1, y1 in self.region_detector.propose(page):
+                for res in self.ocr.ocr(page[y0:y1, x0:x1]) or []:
+                    for box, rec in res or []:
+                        lines.append([[[x + x0, y + y0] for x, y in box], rec])
+            result = [lines]
+            if any(self._process_ocr_result(result, pattern) for pattern, _ in self.patterns.values()):
+                return result
+        return self.ocr.ocr(page)
+
+    def _extract_numbers(self, pattern, correction=None):
+        """Generic method to extract numbers based on a regex pattern."""
+        filtered_numbers = []
+        for result in self.run_ocr():
+            filtered_numbers.extend(self._process_ocr_result(result, pattern))
 
         filtered_numbers = list(dict.fromkeys(filtered_numbers))  # Remove duplicates
 
-        if pan_correction and filtered_numbers:
-            filtered_numbers = [self.pan_correction(num) for num in filtered_numbers]
+        if correction and filtered_numbers:
+            filtered_numbers = [correction(num) for num in filtered_numbers]
 
         if not filtered_numbers:
             print(f'No matches found for pattern: {pattern}')
@@ -68,30 +125,25 @@ class DocumentExtractor:
                     matches.extend(found_matches)
         return matches
 
-    def _convert_pdf_to_images(self, pdf_path):
-        """Convert PDF pages to images using PyMuPDF (fitz)."""
-        doc = fitz.open(pdf_path)
-        images = []
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            # Render the page as a pixmap (image)
-            pix = page.get_pixmap(dpi=300)
-            image = fitz.Pixmap(pix)
-            images.append(image)
-        return images
+    @staticmethod
+    def _iter_pdf_pages(pdf_path, dpi=300):
+        """Yield PDF pages one at a time as BGR NumPy views over the rendered pixmap."""
+        with fitz.open(pdf_path) as doc:
+            for page in doc:
+                pix = page.get_pixmap(dpi=dpi, alpha=False)
+                # Zero-copy view of the pixmap samples; only valid while `pix` is alive,
+                # which the generator frame guarantees until the caller asks for the next page.
+                array = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+                yield array[:, :, ::-1]  # PaddleOCR expects BGR like cv2.imread
+                del array, pix
 
 if __name__ == "__main__":
     file_path = r"C:\Users\dwaip\OneDrive\Desktop\Aadhar_pan\card3.png" 
 
     extractor = DocumentExtractor(file_path)
 
-    # Extract Driving License numbers
-    dl_numbers = extractor.extract_dl_numbers()
-    print("Driving License Numbers:", dl_numbers)
-
-
-    pan_numbers = extractor.extract_pan_numbers()
-    print("PAN Numbers:", pan_numbers)
-
-    epic_numbers = extractor.extract_epic_numbers()
-    print("EPIC Numbers:", epic_numbers)
+    # OCR the file once and run the DL, PAN and EPIC patterns on the same result
+    numbers = extractor.extract_all()
+    print("Driving License Numbers:", numbers["dl"])
+    print("PAN Numbers:", numbers["pan"])
+    print("EPIC Numbers:", numbers["epic"])
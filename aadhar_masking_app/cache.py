@@ -0,0 +1,132 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class OCRCache:
+    """Content-addressed cache for OCR results with an LRU memory tier and an optional SQLite tier.
+
+    Keys are derived from the page pixels plus the engine/model name and prompt, so the same
+    page sent through the same engine is only recognised once. Values must be JSON-serialisable.
+    """
+
+    def __init__(self, max_entries: int = 256, db_path: str = None, max_disk_entries: int = 10_000, ttl: float = None):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ocr_cache_accessed ON ocr_cache (accessed)")
+            self._db.commit()
+
+    @staticmethod
+    def make_key(pixels, model: str, prompt: str = "") -> str:
+        """Hash page pixels (any contiguous bytes-like buffer) together with the model and prompt."""
+        digest = hashlib.sha256()
+        digest.update(model.encode())
+        digest.update(b"\0")
+        digest.update(prompt.encode())
+        digest.update(b"\0")
+        digest.update(pixels)
+        return digest.hexdigest()
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created FROM ocr_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1]):
+                        self._db.execute("UPDATE ocr_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, value, row[1])
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value):
+        """Store `value` in the memory tier and, if configured, the disk tier."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO ocr_cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now, now),
+                )
+                overflow = self._db.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0] - self.max_disk_entries
+                if overflow > 0:
+                    self._db.execute(
+                        "DELETE FROM ocr_cache WHERE key IN "
+                        "(SELECT key FROM ocr_cache ORDER BY accessed LIMIT ?)",
+                        (overflow,),
+                    )
+                    self.evictions += overflow
+                if self.ttl is not None:
+                    self._db.execute("DELETE FROM ocr_cache WHERE created < ?", (now - self.ttl,))
+                self._db.commit()
+
+    def _remember(self, key: str, value, created: float):
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes, for sizing the cache."""
+        with self._lock:
+            disk_entries = None
+            if self._db is not None:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM ocr_cache").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+            }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,69 @@
+import os
+import base64
+from io import BytesIO
+from PIL import Image
+
+
+class ImageEncoder:
+    """Downsample and compress page images to what a vision model actually sees before sending them.
+
+    `encode` returns the base64 payload together with the scale factor applied, so boxes the model
+    reports on the encoded image can be mapped back onto the original for masking.
+    """
+
+    FORMATS = {"JPEG": "JPEG", "JPG": "JPEG", "WEBP": "WEBP", "PNG": "PNG"}
+
+    def __init__(self, max_side: int = None, image_format: str = None, quality: int = None):
+        # llama3.2-vision tiles inputs into 560px crops and uses at most 2x2 of them
+        self.max_side = max_side or int(os.getenv("VISION_MAX_SIDE", "1120"))
+        image_format = (image_format or os.getenv("VISION_IMAGE_FORMAT", "JPEG")).upper()
+        if image_format not in self.FORMATS:
+            raise ValueError(f"Unsupported encoding format: {image_format}")
+        self.image_format = self.FORMATS[image_format]
+        self.quality = quality or int(os.getenv("VISION_IMAGE_QUALITY", "85"))
+
+    @property
+    def signature(self) -> str:
+        """Settings that change what the model sees; part of OCR cache keys."""
+        return f"{self.image_format}:{self.max_side}:{self.quality}"
+
+    def fit(self, img):
+        """Return (image, scale) with the longest side capped at max_side; never upsamples."""
+        scale = min(1.0, self.max_side / max(img.width, img.height))
+        if scale < 1.0:
+            size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+            img = img.resize(size, Image.BILINEAR, reducing_gap=2.0)
+        return img, scale
+
+    def encode_bytes(self, img):
+        """Return (encoded bytes, scale) for `img`; the original image is left untouched."""
+        resized, scale = self.fit(img)
+        if self.image_format != "PNG" and resized.mode not in ("RGB", "L"):
+            resized = resized.convert("RGB")
+
+        buffered = BytesIO()
+        if self.image_format == "PNG":
+            resized.save(buffered, format="PNG")
+        else:
+            resized.save(buffered, format=self.image_format, quality=self.quality)
+        data = buffered.getvalue()
+        buffered.close()
+        if resized is not img:
+            resized.close()
+        return data, scale
+
+    def encode(self, img):
+        """Return (base64 string, scale) for `img`."""
+        data, scale = self.encode_bytes(img)
+        return base64.b64encode(data).decode("utf-8"), scale
+
+    @staticmethod
+    def rescale_boxes(page: dict, factor: float) -> dict:
+        """Multiply every word/line bbox of an OCR page by `factor` in place and return it."""
+        if factor == 1.0:
+            return page
+        for key in ("words", "lines"):
+            for item in page.get(key, []):
+                if item.get("bbox"):
+                    item["bbox"] = [value * factor for value in item["bbox"]]
+        return page
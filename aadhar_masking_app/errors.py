@@ -0,0 +1,2 @@
+class ImageTooLarge(ValueError):
+    """The image cannot be read within the memory budget (see tiling.TiledImage.check)."""
@@ -0,0 +1,255 @@
+"""Persistent job queue for masking large documents outside the request cycle.
+
+The API queues uploads with `POST /jobs` and returns at once. Separate worker processes, started with
+
+    python jobs.py --workers 4
+
+claim jobs from the SQLite queue, record per-page progress and write the masked file next to it.
+Queue, inputs and results live under MASK_JOBS_DIR, so jobs survive restarts of both the API and
+the workers; jobs left running by a worker that died are queued again.
+"""
+import os
+import json
+import time
+import uuid
+import shutil
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+
+
+JOBS_DIR = os.getenv("MASK_JOBS_DIR", "mask_jobs")
+POLL_SECONDS = float(os.getenv("MASK_JOBS_POLL", "1.0"))
+MAX_ATTEMPTS = int(os.getenv("MASK_JOBS_MAX_ATTEMPTS", "3"))  # Worker crashes tolerated per job
+OUTPUT_SUFFIXES = {"application/pdf": ".pdf", "image/png": ".png"}
+
+
+class JobStore:
+    """Jobs table in SQLite plus input and output files on disk; safe to share between processes."""
+
+    def __init__(self, root: str = None):
+        self.root = root or JOBS_DIR
+        os.makedirs(os.path.join(self.root, "files"), exist_ok=True)
+        self._lock = threading.Lock()
+        # Autocommit, with explicit transactions where a read must not race another process
+        self._db = sqlite3.connect(
+            os.path.join(self.root, "jobs.db"), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, filename TEXT, file_ext TEXT NOT NULL, "
+            "pages_done INTEGER NOT NULL DEFAULT 0, pages_total INTEGER, comments TEXT NOT NULL DEFAULT '[]', "
+            "result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0, worker_pid INTEGER, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (status, created)")
+
+    def input_path(self, job: dict) -> str:
+        return os.path.join(self.root, "files", job["id"] + job["file_ext"])
+
+    def output_path(self, job: dict) -> str:
+        """Path of a finished job's masked file."""
+        suffix = OUTPUT_SUFFIXES[job["result"]["media_type"]]
+        return os.path.join(self.root, "files", f"{job['id']}.masked{suffix}")
+
+    def submit(self, data: bytes, filename: str, file_ext: str) -> str:
+        """Queue a document for masking and return its job ID."""
+        job_id = uuid.uuid4().hex
+        # Write the input before the row exists, so a worker never claims a job without its file
+        with open(self.input_path({"id": job_id, "file_ext": file_ext}), "wb") as f:
+            f.write(data)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, filename, file_ext, created, updated) VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, filename, file_ext, now, now),
+            )
+        return job_id
+
+    def get(self, job_id: str):
+        """The job as a dict, or None if there is no such job."""
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row is not None else None
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job = dict(row)
+        job["comments"] = json.loads(job["comments"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self, worker_pid: int):
+        """Mark the oldest queued job as running for `worker_pid` and return it, or None if the queue is empty."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' ORDER BY created LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE jobs SET status = 'running', worker_pid = ?, attempts = attempts + 1, updated = ? "
+                        "WHERE id = ?",
+                        (worker_pid, time.time(), row["id"]),
+                    )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return self._to_dict(row) if row is not None else None
+
+    def progress(self, job_id: str, pages_done: int, pages_total: int, comments: list):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET pages_done = ?, pages_total = ?, comments = ?, updated = ? WHERE id = ?",
+                (pages_done, pages_total, json.dumps(comments), time.time(), job_id),
+            )
+
+    def finish(self, job: dict, result: dict):
+        """Store the masked file from a `raw_output` masking result and mark the job done."""
+        spooled = result.pop("output_path", None)
+        output = result.pop("output", None)
+        job["result"] = result
+        if spooled is not None:
+            shutil.move(spooled, self.output_path(job))
+        else:
+            with open(self.output_path(job), "wb") as f:
+                f.write(output)
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'done', comments = ?, result = ?, updated = ? WHERE id = ?",
+                (json.dumps(result.pop("comments")), json.dumps(result), time.time(), job["id"]),
+            )
+        self._remove(self.input_path(job))
+
+    def fail(self, job: dict, error: str):
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, updated = ? WHERE id = ?", (error, time.time(), job["id"])
+            )
+        self._remove(self.input_path(job))
+
+    def requeue_orphans(self) -> int:
+        """Queue again the running jobs whose worker process is gone; returns how many were requeued.
+
+        Jobs that already took down MAX_ATTEMPTS workers are failed instead of retried forever.
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT * FROM jobs WHERE status = 'running'").fetchall()
+        requeued = 0
+        for row in rows:
+            if _pid_alive(row["worker_pid"]):
+                continue
+            if row["attempts"] >= MAX_ATTEMPTS:
+                self.fail(dict(row), f"Worker exited during processing {row['attempts']} times")
+                continue
+            with self._lock:
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', worker_pid = NULL, pages_done = 0, comments = '[]', "
+                    "updated = ? WHERE id = ? AND status = 'running'",
+                    (time.time(), row["id"]),
+                )
+            requeued += 1
+        return requeued
+
+    def delete(self, job_id: str) -> bool:
+        """Remove a job and its files; returns False if there was no such job."""
+        job = self.get(job_id)
+        if job is None:
+            return False
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        self._remove(self.input_path(job))
+        if job["result"]:
+            self._remove(self.output_path(job))
+        return True
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        self._db.close()
+
+
+def _pid_alive(pid) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_job(store: JobStore, job: dict):
+    """Mask one claimed job, recording progress after every page."""
+    from workers import get_masker  # Imported here so the API process does not load the models
+
+    comments = []
+
+    def on_page(pages_done: int, pages_total: int, comment: str):
+        comments.append(comment)
+        store.progress(job["id"], pages_done, pages_total, comments)
+
+    try:
+        with open(store.input_path(job), "rb") as f:
+            data = f.read()
+        result = get_masker().mask_aadhar_final(data, file_ext=job["file_ext"], raw_output=True, on_page=on_page)
+    except Exception as e:
+        store.fail(job, f"Processing failed: {str(e)}")
+        return
+    store.finish(job, result)
+
+
+def run_worker(root: str = None, poll: float = POLL_SECONDS):
+    """Claim and process jobs forever, one at a time."""
+    store = JobStore(root)
+    while True:
+        job = store.claim(os.getpid())
+        if job is None:
+            time.sleep(poll)
+            continue
+        process_job(store, job)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run masking job workers.")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MASK_JOB_WORKERS", "0")) or os.cpu_count() or 1)
+    parser.add_argument("--dir", default=JOBS_DIR, help="Queue directory shared with the API (MASK_JOBS_DIR)")
+    args = parser.parse_args()
+
+    def start():
+        process = multiprocessing.Process(target=run_worker, args=(args.dir,), name="mask-job-worker")
+        process.start()
+        return process
+
+    store = JobStore(args.dir)
+    store.requeue_orphans()
+    processes = [start() for _ in range(args.workers)]
+    try:
+        # Replace workers that die (e.g. killed on a huge scan) and put their jobs back on the queue
+        while True:
+            time.sleep(5)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    processes[i] = start()
+            store.requeue_orphans()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
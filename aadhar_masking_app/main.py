@@ -1,33 +1,417 @@
 import os
+import re
+import json
+import time
 import uuid
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
-from masking import AadharMask
+import base64
+import asyncio
+import itertools
+from typing import List
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Query
+from fastapi.responses import JSONResponse, StreamingResponse, Response, FileResponse
+from starlette.background import BackgroundTask
+from workers import MaskingPool, get_masker, mask_document, warm_up, cache_stats as worker_cache_stats
+from jobs import JobStore
+from errors import ImageTooLarge  # Not from tiling, which would load NumPy and PIL here
+import metrics
 
 
 app = FastAPI(title="Aadhaar Masking API", version="1.0")
 
-masker = AadharMask()
-UPLOAD_DIR = "temp"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+# "process" (default) masks on worker processes, so throughput scales with cores. "thread" keeps
+# everything in the API process: each thread gets its own masker and engines, but rendering and
+# OCR then contend for the GIL, and PyMuPDF does not support use from several threads, so keep
+# MASK_PDF_WORKERS=1 with it. Meant for development and single-core hosts.
+EXECUTOR_KIND = os.getenv("MASK_EXECUTOR", "process")
+SUPPORTED_EXTENSIONS = [".pdf", ".png", ".jpg", ".jpeg"]
+BATCH_CONCURRENCY = int(os.getenv("MASK_BATCH_CONCURRENCY", "8"))
+TIMING_HEADERS = os.getenv("MASK_TIMING_HEADERS", "0") == "1"  # Add a Server-Timing header to /mask-aadhar
+RESPONSE_FORMATS = ["json", "binary", "multipart"]
+OUTPUT_CHUNK_SIZE = 64 * 1024
+WARMUP = os.getenv("MASK_WARMUP", "1") == "1"  # Load engines and the model at startup; /ready waits for it
+WARMUP_RETRY_SECONDS = 10
+
+# PDFs and images run on separate pools so large bundles cannot starve small image requests.
+# Each worker builds its AadharMask as it starts, not on its first request.
+pdf_pool = MaskingPool(
+    kind=EXECUTOR_KIND,
+    max_workers=int(os.getenv("MASK_PDF_WORKERS", "0")) or None,
+    max_in_flight=int(os.getenv("MASK_PDF_MAX_IN_FLIGHT", "0")) or None,
+    initializer=get_masker,
+)
+image_pool = MaskingPool(
+    kind=EXECUTOR_KIND,
+    max_workers=int(os.getenv("MASK_IMAGE_WORKERS", "0")) or None,
+    max_in_flight=int(os.getenv("MASK_IMAGE_MAX_IN_FLIGHT", "0")) or None,
+    initializer=get_masker,
+)
+# Queue for /jobs; the documents are masked by the `python jobs.py` worker processes.
+job_store = JobStore()
+
+
+readiness = {"ready": not WARMUP, "warmup_seconds": None, "error": None}
+
+
+async def warm_up_pools():
+    """Warm up every pool, retrying until it works."""
+    pools = [pdf_pool, image_pool]
+    while not readiness["ready"]:
+        try:
+            seconds = await asyncio.gather(*(pool.run(warm_up) for pool in pools))
+            readiness.update(ready=True, warmup_seconds=max(seconds), error=None)
+        except Exception as e:
+            readiness["error"] = f"Warm-up failed: {str(e)}"
+            await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    # In the background: the server accepts connections at once and /ready reports when it is warm
+    if WARMUP:
+        app.state.warm_up_task = asyncio.create_task(warm_up_pools())
+
+
+@app.on_event("shutdown")
+def shutdown_pools():
+    pdf_pool.shutdown()
+    image_pool.shutdown()
+    job_store.close()
+
+
+@app.middleware("http")
+async def track_requests(request: Request, call_next):
+    """Record latency by endpoint and status, and the number of requests in flight."""
+    in_flight = metrics.IN_FLIGHT.labels("request")
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        # The route template, not the raw path: one series for /jobs/{job_id}, not one per job
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or "other"
+        metrics.REQUEST_SECONDS.labels(endpoint, str(status)).observe(time.perf_counter() - start)
+
+
+async def run_masking(data: bytes, file_ext: str, with_timings: bool = False, raw_output: bool = False) -> dict:
+    """Mask one document on the pool for its file type."""
+    pool = pdf_pool if file_ext == ".pdf" else image_pool
+    return await pool.run(mask_document, data, file_ext, with_timings, raw_output)
+
+
+def negotiate(accept: str, media_type: str) -> str:
+    """Response format for an Accept header: "binary", "multipart", or "json" (the default).
+
+    Types are taken by descending q-value, then in the order listed, and q=0 excludes a type.
+    Binary types that do not match the masked file's `media_type` (e.g. image/png for a PDF
+    upload) are skipped.
+    """
+    ranked = []
+    for index, item in enumerate((accept or "").split(",")):
+        kind, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((-q, index, kind.lower()))
+    for _, _, kind in sorted(ranked):
+        if kind == "application/json":
+            return "json"
+        if kind == "multipart/mixed":
+            return "multipart"
+        if kind in (media_type, "application/octet-stream") or (kind == "image/*" and media_type.startswith("image/")):
+            return "binary"
+    return "json"
+
+
+def iter_chunks(*parts):
+    """Yield the given byte strings in OUTPUT_CHUNK_SIZE pieces without copying them whole."""
+    for part in parts:
+        view = memoryview(part)
+        for start in range(0, len(view), OUTPUT_CHUNK_SIZE):
+            yield bytes(view[start:start + OUTPUT_CHUNK_SIZE])
+
+
+def iter_file(path: str, chunk_size: int = OUTPUT_CHUNK_SIZE):
+    """Yield a file's bytes in `chunk_size` pieces."""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def pop_output(result: dict) -> tuple:
+    """Take the masked file out of a `raw_output` result as (chunks, length, background cleanup).
+
+    Files spooled to disk by the masker (result["output_path"]) are streamed from there and
+    deleted once sent.
+    """
+    path = result.pop("output_path", None)
+    if path is not None:
+        return iter_file(path), os.path.getsize(path), BackgroundTask(os.remove, path)
+    output = result.pop("output")
+    return iter_chunks(output), len(output), None
+
+
+def json_response(result: dict, headers: dict) -> Response:
+    """The results as JSON; a masked file spooled to disk is base64-encoded into it as it streams."""
+    path = result.pop("output_path", None)
+    if path is None:
+        return JSONResponse(content=result, headers=headers)
+    result.pop("media_type")
+    head = json.dumps(result, separators=(",", ":"))[:-1].encode() + b',"base64_output":"'
+    tail = b'"}'
+    headers["Content-Length"] = str(len(head) + 4 * -(-os.path.getsize(path) // 3) + len(tail))
+    # Whole 3-byte groups per read, so the base64 pieces concatenate without padding in between
+    chunks = (base64.b64encode(chunk) for chunk in iter_file(path, OUTPUT_CHUNK_SIZE // 4 * 3))
+    return StreamingResponse(
+        itertools.chain([head], chunks, [tail]), media_type="application/json", headers=headers,
+        background=BackgroundTask(os.remove, path),
+    )
+
+
+def inline_output(result: dict) -> dict:
+    """Replace a masked file spooled to disk with its base64, for responses that hold every result."""
+    path = result.pop("output_path", None)
+    if path is not None:
+        result.pop("media_type")
+        try:
+            with open(path, "rb") as f:
+                result["base64_output"] = base64.b64encode(f.read()).decode()
+        finally:
+            os.remove(path)
+    return result
+
+
+def output_filename(filename: str, media_type: str) -> str:
+    stem = re.sub(r"[^A-Za-z0-9._-]", "_", os.path.splitext(os.path.basename(filename))[0])
+    return f"masked_{stem}" + (".pdf" if media_type == "application/pdf" else ".png")
+
+
+def result_headers(valid: bool, summary: str, comments: list) -> dict:
+    """Masking results as X-Aadhaar-* headers, for responses whose body is the masked file."""
+    return {
+        "X-Aadhaar-Valid": "true" if valid else "false",
+        "X-Aadhaar-Summary": summary,
+        "X-Aadhaar-Comments": json.dumps(comments),
+    }
+
+
+def binary_response(result: dict, filename: str, headers: dict) -> StreamingResponse:
+    """The masked file as the response body, with the masking results in X-Aadhaar-* headers."""
+    chunks, length, cleanup = pop_output(result)
+    media_type = result.pop("media_type")
+    headers.update({
+        "Content-Length": str(length),
+        "Content-Disposition": f'attachment; filename="{output_filename(filename, media_type)}"',
+        **result_headers(result["valid"], result["summary"], result["comments"]),
+    })
+    return StreamingResponse(chunks, media_type=media_type, headers=headers, background=cleanup)
+
+
+def multipart_response(result: dict, filename: str, headers: dict) -> StreamingResponse:
+    """A multipart/mixed body: the JSON results, then the masked file as a binary part."""
+    chunks, length, cleanup = pop_output(result)
+    media_type = result.pop("media_type")
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\nContent-Type: application/json\r\n\r\n{json.dumps(result)}\r\n"
+        f"--{boundary}\r\nContent-Type: {media_type}\r\n"
+        f'Content-Disposition: attachment; filename="{output_filename(filename, media_type)}"\r\n\r\n'
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    headers["Content-Length"] = str(len(head) + length + len(tail))
+    return StreamingResponse(
+        itertools.chain([head], chunks, [tail]), media_type=f"multipart/mixed; boundary={boundary}", headers=headers,
+        background=cleanup,
+    )
+
+
+async def read_upload(file: UploadFile) -> tuple:
+    """Read an upload's bytes; returns (data, seconds taken)."""
+    start = time.perf_counter()
+    data = await file.read()
+    elapsed = time.perf_counter() - start
+    metrics.STAGE_SECONDS.labels("upload").observe(elapsed)
+    return data, elapsed
 
 
 @app.post("/mask-aadhar")
-async def mask_aadhar(file: UploadFile = File(...)):
-    """Upload an image or PDF and get masked Base64 output."""
+async def mask_aadhar(
+    request: Request, file: UploadFile = File(...), response_format: str = Query(None, alias="format")
+):
+    """Upload an image or PDF and get it back masked.
+
+    The response is JSON with Base64 output by default. `Accept: application/pdf` / `image/png`
+    (or `application/octet-stream`) returns the masked file itself with results in X-Aadhaar-*
+    headers, and `Accept: multipart/mixed` returns a JSON part followed by the file. `?format=`
+    (json, binary or multipart) overrides the Accept header.
+    """
     try:
         file_ext = os.path.splitext(file.filename)[1].lower()
-        if file_ext not in [".pdf", ".png", ".jpg", ".jpeg"]:
+        if file_ext not in SUPPORTED_EXTENSIONS:
             raise HTTPException(status_code=400, detail="Unsupported file type")
+        if response_format is not None and response_format not in RESPONSE_FORMATS:
+            raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(RESPONSE_FORMATS)}")
+        media_type = "application/pdf" if file_ext == ".pdf" else "image/png"
+        response_format = response_format or negotiate(request.headers.get("accept"), media_type)
+        raw_output = response_format != "json"
 
-        temp_path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{file_ext}")
-        with open(temp_path, "wb") as f:
-            f.write(await file.read())
-
-        result = masker.mask_aadhar_final(temp_path)
-        os.remove(temp_path)
+        # The upload is already spooled by Starlette; hand the bytes straight to the worker.
+        data, upload_seconds = await read_upload(file)
+        result = await run_masking(data, file_ext, with_timings=TIMING_HEADERS, raw_output=raw_output)
 
-        return JSONResponse(content=result)
+        headers = {"Vary": "Accept"}
+        if TIMING_HEADERS:
+            timings = {"upload": upload_seconds, **result.pop("timings")}
+            headers["Server-Timing"] = metrics.server_timing(timings)
+        if response_format == "binary":
+            return binary_response(result, file.filename, headers)
+        if response_format == "multipart":
+            return multipart_response(result, file.filename, headers)
+        return json_response(result, headers)
 
+    except HTTPException:
+        raise
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+
+@app.post("/mask-aadhar/batch")
+async def mask_aadhar_batch(files: List[UploadFile] = File(...), concurrency: int = None, stream: bool = False):
+    """Upload many images/PDFs in one request; results are per file, optionally streamed as NDJSON."""
+    limit = asyncio.Semaphore(max(1, min(concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)))
+
+    async def process(index: int, filename: str, data: bytes) -> dict:
+        entry = {"index": index, "filename": filename}
+        file_ext = os.path.splitext(filename or "")[1].lower()
+        if file_ext not in SUPPORTED_EXTENSIONS:
+            entry.update(status="error", detail="Unsupported file type")
+            return entry
+        async with limit:
+            try:
+                result = await asyncio.to_thread(inline_output, await run_masking(data, file_ext))
+            except Exception as e:
+                entry.update(status="error", detail=f"Processing failed: {str(e)}")
+                return entry
+        entry.update(status="ok", result=result)
+        return entry
+
+    # Read every part up front: the uploads are closed once the handler returns, before a stream finishes.
+    uploads = [(f.filename, (await read_upload(f))[0]) for f in files]
+    tasks = [asyncio.ensure_future(process(i, name, data)) for i, (name, data) in enumerate(uploads)]
+
+    if stream:
+        async def ndjson():
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield json.dumps(await finished) + "\n"
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    results = await asyncio.gather(*tasks)
+    return JSONResponse(content={"count": len(results), "results": results})
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(file: UploadFile = File(...)):
+    """Queue an image or PDF for masking by the job workers; returns the job ID immediately."""
+    file_ext = os.path.splitext(file.filename or "")[1].lower()
+    if file_ext not in SUPPORTED_EXTENSIONS:
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    data, _ = await read_upload(file)
+    job_id = await asyncio.to_thread(job_store.submit, data, file.filename, file_ext)
+    return {"id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def job_status(job_id: str):
+    """Status (queued, running, done or failed), per-page progress and, once done, the results."""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "filename": job["filename"],
+        "pages_done": job["pages_done"],
+        "pages_total": job["pages_total"],
+        "comments": job["comments"],
+        "result": job["result"],
+        "error": job["error"],
+        "created": job["created"],
+        "updated": job["updated"],
+    }
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result(job_id: str):
+    """The masked file of a finished job, with the masking results in X-Aadhaar-* headers."""
+    job = await asyncio.to_thread(job_store.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    result = job["result"]
+    return FileResponse(
+        job_store.output_path(job),
+        media_type=result["media_type"],
+        filename=output_filename(job["filename"] or job["id"], result["media_type"]),
+        headers=result_headers(result["valid"], result["summary"], job["comments"]),
+    )
+
+
+@app.delete("/jobs/{job_id}", status_code=204)
+async def delete_job(job_id: str):
+    """Forget a job and delete its files."""
+    if not await asyncio.to_thread(job_store.delete, job_id):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return Response(status_code=204)
+
+
+@app.get("/health")
+async def health():
+    """Liveness: the process is up and serving."""
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def ready():
+    """Readiness: 200 once the engines are loaded and the model has answered a warm-up page, else 503."""
+    return JSONResponse(content=readiness, status_code=200 if readiness["ready"] else 503)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the OCR result cache shared by the thread pool workers.
+
+    With the process executor every worker has its own cache (and this process none), so there
+    is no single set of counters to report; use the aadhaar_ocr_cache_lookups_total metric instead.
+    """
+    if EXECUTOR_KIND == "process":
+        raise HTTPException(status_code=404, detail="Cache stats are per worker process; see /metrics")
+    # On a pool thread: building the masker loads fitz, OpenCV and the OCR engines
+    return await image_pool.run(worker_cache_stats)
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; set PROMETHEUS_MULTIPROC_DIR to aggregate process-pool workers."""
+    content, content_type = metrics.render_latest()
+    return Response(content=content, media_type=content_type)
@@ -1,12 +1,19 @@
 import os
 import re
 import io
-import json
 import base64
+import tempfile
 import fitz
 from io import BytesIO
+from collections import deque
 from PIL import Image, ImageDraw
-from ollama import Ollama
+from model_client import get_client
+from encoding import ImageEncoder
+from ocr_backends import LLMBackend
+import verhoeff
+import matcher
+import metrics
+import tiling
 
 
 Image.MAX_IMAGE_PIXELS = 1_000_000_000
@@ -17,147 +24,392 @@ class AadharMask:
 
     AADHAAR_PATTERN = re.compile(r"(?<!\d)\d{4} \d{4} \d{4}(?!\d)")
     POINTS_PER_INCH = 72
+    RENDER_DPI = 100
 
-    MULTIPLICATION_TABLE = (
-        (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
-        (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
-        (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
-        (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
-        (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
-        (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
-        (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
-        (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
-        (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
-        (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
-    )
-
-    PERMUTATION_TABLE = (
-        (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
-        (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
-        (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
-        (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
-        (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
-        (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
-        (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
-        (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
-    )
-
-    def __init__(self):
-        self.ollama = Ollama()
+    SYSTEM_PROMPT = "Extract text and positions as JSON."
+    PREFETCH_PAGES = 4
+    MIN_TEXT_LAYER_WORDS = 5
+    # Pages with more of their area in images than this may carry a scanned number the text layer lacks
+    MAX_TEXT_LAYER_IMAGE_COVERAGE = 0.05
+
+    # Images whose whole-frame processing would exceed the budget are masked tile by tile;
+    # compressed ones whose decoded frame alone exceeds it are rejected (ImageTooLarge)
+    MEMORY_BUDGET = int(os.getenv("MASK_MEMORY_BUDGET_MB", "1024")) * 2 ** 20
+    FULL_FRAME_COPIES = 4  # Decoded frame, RGB copy being drawn on, PNG buffer, Base64 output
+    TILE_SIZE = int(os.getenv("MASK_TILE_SIZE", "2048"))
+    TILE_OVERLAP = int(os.getenv("MASK_TILE_OVERLAP", "384"))  # Must exceed the widest word
+
+    def __init__(self, cache=None, client=None, use_text_layer=True, encoder=None, region_detector=None, router=None):
+        self.client = client or get_client()
+        self.encoder = encoder or ImageEncoder()
+        self.region_detector = region_detector  # Optional NumberRegionDetector to crop before OCR
+        self.router = router  # Optional OCRRouter of cheaper local engines tried before the model
+        self.use_text_layer = use_text_layer
         self.model_name = "llama3.2-vision"
+        self.llm = LLMBackend(self.client, self.encoder, self.model_name, self.SYSTEM_PROMPT)
+        self.cache = cache
 
     def compute_checksum(self, number: str) -> int:
         """Compute Aadhaar checksum (Verhoeff algorithm)."""
-        digits = [int(n) for n in str(number)[::-1]]
-        checksum = 0
-        for i, n in enumerate(digits):
-            checksum = self.MULTIPLICATION_TABLE[checksum][self.PERMUTATION_TABLE[i & 7][n]]
-        return checksum
-
-    def analyze_read(self, input_path: str):
-        """Run OCR via Llama Vision."""
-        images = []
-
-        if input_path.lower().endswith(".pdf"):
-            doc = fitz.open(input_path)
-            for page in doc:
-                pix = page.get_pixmap(dpi=100)
-                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                images.append(img)
-                del pix
-            doc.close()
-        else:
-            images.append(Image.open(input_path))
+        return verhoeff.checksum(str(number))
 
-        ocr_results = []
+    @staticmethod
+    def is_pdf(input_path, file_ext: str = None) -> bool:
+        """Whether the input is a PDF, judged by `file_ext` or else the path suffix."""
+        if file_ext is not None:
+            return file_ext.lower() == ".pdf"
+        return isinstance(input_path, str) and input_path.lower().endswith(".pdf")
+
+    @staticmethod
+    def open_pdf(input_path):
+        """Open a PDF from a path or from in-memory bytes."""
+        if isinstance(input_path, str):
+            return fitz.open(input_path)
+        return fitz.open(stream=input_path, filetype="pdf")
+
+    @staticmethod
+    def open_image(input_path):
+        """Open an image from a path or from in-memory bytes."""
+        if isinstance(input_path, str):
+            return Image.open(input_path)
+        return Image.open(BytesIO(input_path))
+
+    def needs_tiling(self, img) -> bool:
+        """Whether masking `img` (opened, not yet decoded) as one frame would exceed MEMORY_BUDGET."""
+        return img.width * img.height * 3 * self.FULL_FRAME_COPIES > self.MEMORY_BUDGET
+
+    def mask_large_image(self, input_path):
+        """Mask an image tile by tile; returns (path of the masked PNG, comment, invalid flag).
+
+        OCR runs on overlapping TILE_SIZE tiles (streamed through iter_ocr, so only the prefetch
+        window is in memory), the tile pages are merged into one page for matching, and the masked
+        PNG is written band by band to a temporary file, which the caller must delete. Memory stays
+        around a few tiles, after the one full decode of a compressed image that
+        TiledImage.check has let through.
+        """
+        reader = tiling.TiledImage(input_path)
+        # The PNG can be as large as the raw pixels, so it goes to disk rather than into memory
+        out = tempfile.NamedTemporaryFile(suffix=".png", delete=False)
+        try:
+            grid = tiling.tile_grid(reader.width, reader.height, self.TILE_SIZE, self.TILE_OVERLAP)
+
+            def tiles():
+                for box, _ in grid:
+                    with metrics.timed("render"):
+                        tile = reader.read(box)
+                    yield tile
+
+            tile_pages = []
+            for (box, core), (tile, page, _) in zip(grid, self.iter_ocr(tiles())):
+                tile.close()
+                tile_pages.append((page, box, core))
+            boxes, comment, invalid_aadhar = self.find_aadhar_boxes(tiling.merge_tile_pages(tile_pages))
+
+            writer = tiling.PNGWriter(out, reader.width, reader.height)
+            band_rows = max(1, self.TILE_SIZE ** 2 // reader.width)  # About one tile's worth of pixels
+            for y0 in range(0, reader.height, band_rows):
+                y1 = min(y0 + band_rows, reader.height)
+                band = reader.read((0, y0, reader.width, y1))
+                with metrics.timed("mask"):
+                    band_draw = ImageDraw.Draw(band)
+                    for x_min, y_min, x_max, y_max in boxes:
+                        if y_max >= y0 and y_min < y1:
+                            band_draw.rectangle((x_min, y_min - y0, x_max, y_max - y0), fill="orange")
+                with metrics.timed("output_encode"):
+                    writer.write(band)
+                band.close()
+            writer.close()
+            out.close()
+            return out.name, comment, invalid_aadhar
+        except BaseException:
+            out.close()
+            os.remove(out.name)
+            raise
+        finally:
+            reader.close()
+
+    def render_page(self, pdf_page):
+        """Render one PDF page as a RENDER_DPI RGB image."""
+        with metrics.timed("render"):
+            pix = pdf_page.get_pixmap(dpi=self.RENDER_DPI)
+            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+            del pix
+        return img
+
+    @staticmethod
+    def image_coverage(pdf_page) -> float:
+        """Fraction of the page area covered by images (overlapping images counted twice, capped at 1)."""
+        page_area = abs(pdf_page.rect)
+        covered = sum(abs(fitz.Rect(info["bbox"])) for info in pdf_page.get_image_info())
+        return min(1.0, covered / page_area) if page_area else 0.0
+
+    def text_layer_page(self, pdf_page):
+        """Build an OCR-style page from the PDF text layer, or None if the page has no usable text.
+
+        Word boxes are converted from unrotated page points to RENDER_DPI pixels of the displayed
+        page, so they go through the same masking path as model OCR results. On pages with large
+        images (e.g. a scan with a text footer) the text layer is only trusted when it holds a
+        valid number; otherwise the page is rendered and OCRed.
+        """
+        with metrics.timed("text_layer"):
+            words = pdf_page.get_text("words")
+            if len(words) < self.MIN_TEXT_LAYER_WORDS:
+                return None
+
+            scale = self.RENDER_DPI / self.POINTS_PER_INCH
+            to_pixels = pdf_page.rotation_matrix * fitz.Matrix(scale, scale)
+            lines = {}
+            page_words = []
+            for x0, y0, x1, y1, content, block_no, line_no, _ in words:
+                lines.setdefault((block_no, line_no), []).append(content)
+                page_words.append({"content": content, "bbox": list(fitz.Rect(x0, y0, x1, y1) * to_pixels)})
+            page = {
+                "lines": [{"content": " ".join(line)} for line in lines.values()],
+                "words": page_words,
+                "source": "text_layer",
+            }
+            if self.image_coverage(pdf_page) > self.MAX_TEXT_LAYER_IMAGE_COVERAGE and not matcher.match_page(page)[0]:
+                return None
+        return page
+
+    def iter_pdf_pages(self, doc):
+        """Yield each PDF page as its text-layer OCR page when usable, otherwise as a rendered image."""
+        for pdf_page in doc:
+            page = self.text_layer_page(pdf_page) if self.use_text_layer else None
+            yield page if page is not None else self.render_page(pdf_page)
+
+    def _start_ocr(self, img, use_regions: bool = True):
+        """OCR a page from the cache or the local router, or else send it (or its number regions) to the model.
+
+        Returns (cache_key, result, future, scale, layout, source, confident); `result` is set when
+        no model call was needed, `layout` is None unless only region crops were sent, and
+        `confident` tells whether the region proposals were strong enough to skip a full-page retry.
+        """
+        layout = None
+        scored = []
+        if use_regions and self.region_detector:
+            scored = self.region_detector.candidates(img)[:self.region_detector.max_regions]
+        boxes = [box for _, box in scored]
+        confident = self.region_detector is not None and self.region_detector.is_confident(scored)
+
+        cache_key = None
+        if self.cache is not None:
+            pixels = f"{img.mode}:{img.width}x{img.height}:".encode() + img.tobytes()
+            prompt = f"{self.SYSTEM_PROMPT}|{self.encoder.signature}" + ("|regions" if boxes else "")
+            cache_key = self.cache.make_key(pixels, self.model_name, prompt)
+            result = self.cache.get(cache_key)
+            metrics.CACHE_LOOKUPS.labels("miss" if result is None else "hit").inc()
+            if result is not None:
+                return cache_key, result, None, 1.0, [] if boxes else None, "cache", confident
+
+        # Cheap engines first; a page they read a valid number from with good confidence never
+        # reaches the model. Not on the full-page retry: the router already saw the full page.
+        if self.router is not None and use_regions:
+            result, accepted = self.router.cascade(img)
+            if accepted:
+                if cache_key is not None:
+                    self.cache.set(cache_key, result)
+                return cache_key, result, None, 1.0, None, result["source"], confident
+
+        target = img
+        if boxes:
+            with metrics.timed("encode"):
+                target, layout = self.region_detector.stack_regions(img, boxes)
+        future, scale = self.llm.submit(target)
+        if target is not img:
+            target.close()
+        return cache_key, None, future, scale, layout, "model", confident
+
+    def _finish_ocr(self, pending) -> dict:
+        cache_key, result, future, scale, layout, _, _ = pending
+        if result is not None:
+            return result
+        # Boxes come back in the sent image's pixels; map stacked crops back onto the page and cache
+        result = self.llm.parse(future, scale)
+        if layout:
+            self.region_detector.unstack_page(result, layout)
+        if cache_key is not None:
+            self.cache.set(cache_key, result)
+        return result
+
+    def _resolve_ocr(self, img, pending) -> tuple:
+        """Finish a page's OCR and match it; returns (ocr_result, (spans, candidate_count)).
+
+        The full page is OCRed again only when region crops held nothing Aadhaar-shaped and the
+        detector was not confident in its proposals. A confidently found number band that is not
+        an Aadhaar (e.g. on a PAN card) costs one model call, not two.
+        """
+        metrics.PAGES.labels(pending[5]).inc()
+        result = self._finish_ocr(pending)
+        match = self.match_page(result)
+        if pending[4] is not None and not pending[6] and not match[1]:
+            result = self._finish_ocr(self._start_ocr(img, use_regions=False))
+            match = self.match_page(result)
+        return result, match
+
+    def iter_ocr(self, images, prefetch: int = None):
+        """Yield (image, ocr_result, match) page by page, in order; `match` is the page's
+        (spans, candidate_count) for find_aadhar_boxes.
+
+        Up to `prefetch` pages are rendered, encoded and sent to the model ahead of the page being
+        yielded, so rendering overlaps with OCR while memory stays bounded by the window size.
+        Items that are already OCR pages (dicts, e.g. from the text layer) skip the model and are
+        yielded with a None image. The caller owns the yielded images and should close them.
+        """
+        prefetch = max(1, prefetch or self.PREFETCH_PAGES)
+        window = deque()
         for img in images:
-            buffered = BytesIO()
-            img.save(buffered, format="PNG")
-            img_b64 = base64.b64encode(buffered.getvalue()).decode()
-            buffered.close()
-
-            response = self.ollama.chat(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "Extract text and positions as JSON."},
-                    {"role": "user", "content": img_b64},
-                ],
-            )
-            result = json.loads(response["choices"][0]["message"]["content"])
-            ocr_results.append(result)
-            img.close()
+            if isinstance(img, dict):
+                window.append((None, (None, img, None, 1.0, None, "text_layer", False)))
+            else:
+                window.append((img, self._start_ocr(img)))
+            if len(window) >= prefetch:
+                img, pending = window.popleft()
+                yield (img, *self._resolve_ocr(img, pending))
+        while window:
+            img, pending = window.popleft()
+            yield (img, *self._resolve_ocr(img, pending))
+
+    def analyze_read(self, input_path, file_ext: str = None):
+        """Run OCR via Llama Vision on a file path or raw file bytes."""
+        ocr_results = []
+        if self.is_pdf(input_path, file_ext):
+            with self.open_pdf(input_path) as doc:
+                for img, result, _ in self.iter_ocr(self.iter_pdf_pages(doc)):
+                    ocr_results.append(result)
+                    if img is not None:
+                        img.close()
+        else:
+            for img, result, _ in self.iter_ocr([self.open_image(input_path)]):
+                ocr_results.append(result)
+                img.close()
 
         return {"pages": ocr_results}
 
-    def convert_img_to_b64(self, img) -> str:
-        buf = BytesIO()
-        img.save(buf, format="PNG")
-        result = base64.b64encode(buf.getvalue()).decode()
-        buf.close()
+    def convert_img_to_bytes(self, img) -> bytes:
+        with metrics.timed("output_encode"):
+            buf = BytesIO()
+            img.save(buf, format="PNG")
+            result = buf.getvalue()
+            buf.close()
         return result
 
+    def convert_pdf_to_bytes(self, doc) -> bytes:
+        with metrics.timed("output_encode"):
+            # garbage=3 drops the unredacted image streams left behind by apply_redactions
+            return doc.write(garbage=3, deflate=True)
+
+    def convert_img_to_b64(self, img) -> str:
+        return base64.b64encode(self.convert_img_to_bytes(img)).decode()
+
     def convert_pdf_to_b64(self, doc) -> str:
-        pdf_bytes = doc.write()
-        return base64.b64encode(pdf_bytes).decode("utf-8")
+        return base64.b64encode(self.convert_pdf_to_bytes(doc)).decode("utf-8")
 
-    def mask_aadhar_img(self, img, page):
-        """Mask Aadhaar number regions in an image."""
-        img_draw = ImageDraw.Draw(img)
-        words = [w for w in getattr(page, "words", []) if any(c.isdigit() for c in w["content"])]
-        text = "\n".join([line["content"] for line in page["lines"]])
-
-        match = self.AADHAAR_PATTERN.search(text)
-        comment = "No Aadhaar number detected"
-        invalid_aadhar = 1
-
-        if match:
-            aadhar_number = re.sub(r"\s", "", match.group())
-            if self.compute_checksum(aadhar_number) == 0:
-                masked_words = match.group().strip().split()[:2]
-                for word in words:
-                    if word["content"].strip() in masked_words:
-                        x_min, y_min, x_max, y_max = word["bbox"]
-                        img_draw.rectangle((x_min, y_min, x_max, y_max), fill="orange")
-                comment = "Aadhaar masked successfully"
-                invalid_aadhar = 0
-            else:
-                comment = "Checksum failed, invalid Aadhaar detected"
+    def match_page(self, page) -> tuple:
+        """(spans, candidate_count) for an OCR page; see matcher.find_aadhaar_spans."""
+        with metrics.timed("match"):
+            return matcher.match_page(page)
+
+    def find_aadhar_boxes(self, page, match: tuple = None):
+        """Locate valid Aadhaar numbers on an OCR page; returns (bboxes, comment, invalid flag).
+
+        Matching runs once over the page's tokens (pass `match` from iter_ocr to reuse its result)
+        and masks exactly the tokens (or parts of tokens) holding the first 8 digits of each valid
+        number, even when it is split across lines.
+        """
+        spans, candidates = match if match is not None else self.match_page(page)
+        if spans:
+            boxes = [box for span in spans for box in span["boxes"]]
+            # A number OCR gave no position for cannot be masked; never report it as done
+            if not all(span["boxes"] for span in spans):
+                return boxes, "Aadhaar detected but its position is unknown, not masked", 1
+            return boxes, "Aadhaar masked successfully", 0
+        if candidates:
+            metrics.CHECKSUM_FAILURES.inc()
+            return [], "Checksum failed, invalid Aadhaar detected", 1
+        return [], "No Aadhaar number detected", 1
 
+    def mask_aadhar_img(self, img, page, match: tuple = None):
+        """Mask Aadhaar number regions in an image."""
+        boxes, comment, invalid_aadhar = self.find_aadhar_boxes(page, match)
+        with metrics.timed("mask"):
+            img_draw = ImageDraw.Draw(img)
+            for x_min, y_min, x_max, y_max in boxes:
+                img_draw.rectangle((x_min, y_min, x_max, y_max), fill="orange")
         return img, comment, invalid_aadhar
 
-    def mask_aadhar_final(self, input_path: str):
-        """Main entry point for masking operation."""
-        ocr_extract = self.analyze_read(input_path)
+    def mask_aadhar_pdf_page(self, pdf_page, page, match: tuple = None):
+        """Redact Aadhaar regions on a PDF page in place, using OCR boxes from its RENDER_DPI render."""
+        boxes, comment, invalid_aadhar = self.find_aadhar_boxes(page, match)
+        if boxes:
+            with metrics.timed("mask"):
+                # Render pixels -> points on the displayed page -> unrotated page space used by annotations
+                scale = self.POINTS_PER_INCH / self.RENDER_DPI
+                to_page = fitz.Matrix(scale, scale) * pdf_page.derotation_matrix
+                for box in boxes:
+                    pdf_page.add_redact_annot(fitz.Rect(box) * to_page, fill=(1, 0.65, 0))
+                # Blank the covered pixels of scanned images too, so the number is gone from the file
+                pdf_page.apply_redactions(images=fitz.PDF_REDACT_IMAGE_PIXELS)
+        return comment, invalid_aadhar
+
+    def mask_aadhar_final(self, input_path, file_ext: str = None, raw_output: bool = False, on_page=None):
+        """Main entry point for masking operation.
+
+        `input_path` is a file path, or the raw uploaded bytes together with `file_ext`. The masked
+        file is returned base64-encoded under "base64_output", or with `raw_output` as bytes under
+        "output" together with its "media_type". Images masked tile by tile are too large for
+        either: their PNG is left in a temporary file under "output_path" (with "media_type"),
+        which the caller must delete. `on_page(pages_done, pages_total, comment)` is called after
+        each page, for progress reporting.
+        """
         all_comments = []
         invalid_count = 0
+        output_path = None
 
-        if input_path.lower().endswith(".pdf"):
-            doc = fitz.open(input_path)
-            for idx, page in enumerate(ocr_extract["pages"]):
-                text = " ".join([l["content"] for l in page["lines"]])
-                matches = self.AADHAAR_PATTERN.findall(text)
-                if not matches:
-                    invalid_count += 1
-                    all_comments.append("No Aadhaar number detected")
-                    continue
-                # Add masking logic for PDF if needed
-            base64_output = self.convert_pdf_to_b64(doc)
+        if self.is_pdf(input_path, file_ext):
+            # One open document serves both rendering and output; pages stream through OCR.
+            doc = self.open_pdf(input_path)
+            # Only pages with a valid number get redaction annotations; the rest are left untouched.
+            for page_no, (img, page, match) in enumerate(self.iter_ocr(self.iter_pdf_pages(doc))):
+                if img is not None:
+                    img.close()
+                comment, invalid = self.mask_aadhar_pdf_page(doc[page_no], page, match)
+                invalid_count += invalid
+                all_comments.append(comment)
+                if on_page is not None:
+                    on_page(page_no + 1, len(doc), comment)
+            output = self.convert_pdf_to_bytes(doc) if raw_output else self.convert_pdf_to_b64(doc)
+            media_type = "application/pdf"
             doc.close()
         else:
-            img = Image.open(input_path)
-            page = ocr_extract["pages"][0]
-            masked_img, comment, invalid = self.mask_aadhar_img(img, page)
+            img = self.open_image(input_path)
+            if self.needs_tiling(img):
+                with img:
+                    tiling.TiledImage.check(img, input_path, self.MEMORY_BUDGET)
+                output_path, comment, invalid = self.mask_large_image(input_path)
+            else:
+                img, page, match = next(self.iter_ocr([img]))
+                masked_img, comment, invalid = self.mask_aadhar_img(img, page, match)
+                output = self.convert_img_to_bytes(masked_img) if raw_output else self.convert_img_to_b64(masked_img)
+                img.close()
             invalid_count += invalid
             all_comments.append(comment)
-            base64_output = self.convert_img_to_b64(masked_img)
-            img.close()
+            if on_page is not None:
+                on_page(1, 1, comment)
+            media_type = "image/png"
 
         valid_flag = invalid_count == 0
         final_comment = "Aadhaar masking completed" if valid_flag else "Invalid or no Aadhaar detected"
 
-        return {
-            "base64_output": base64_output,
+        result = {
             "valid": valid_flag,
             "comments": all_comments,
             "summary": final_comment,
         }
+        if output_path is not None:
+            result.update(output_path=output_path, media_type=media_type)
+        elif raw_output:
+            result.update(output=output, media_type=media_type)
+        else:
+            result["base64_output"] = output
+        return result
@@ -0,0 +1,117 @@
+import verhoeff
+
+
+AADHAAR_DIGITS = 12
+MASKED_DIGITS = 8  # The first two groups are masked; the last four stay visible
+_NUMERIC_CHARS = set("0123456789") | set(verhoeff.OCR_CONFUSIONS)
+
+
+def page_tokens(page: dict) -> list:
+    """Flatten an OCR page into (text, bbox) tokens in reading order.
+
+    Word boxes are used when the page has them; otherwise each line is split on spaces and the
+    line box is divided among its tokens in proportion to their character offsets.
+    """
+    if page.get("words"):
+        return [(word["content"], word.get("bbox")) for word in page["words"]]
+
+    tokens = []
+    for line in page.get("lines", []):
+        content = line["content"]
+        bbox = line.get("bbox")
+        offset = 0
+        for part in content.split(" "):
+            if part:
+                tokens.append((part, _sub_box(bbox, len(content), offset, offset + len(part))))
+            offset += len(part) + 1
+    return tokens
+
+
+def _sub_box(bbox, length: int, start: int, end: int):
+    """Horizontal slice of `bbox` covering characters [start, end) of a `length`-character string."""
+    if not bbox or length <= 0:
+        return None
+    x_min, y_min, x_max, y_max = bbox
+    char_width = (x_max - x_min) / length
+    return (x_min + start * char_width, y_min, x_min + end * char_width, y_max)
+
+
+def _numeric_core(text: str):
+    """(start, end) of `text` with surrounding punctuation stripped, or None if it is not a number token."""
+    start, end = 0, len(text)
+    while start < end and not text[start].isalnum() and text[start] != "|":
+        start += 1
+    while end > start and not text[end - 1].isalnum() and text[end - 1] != "|":
+        end -= 1
+    core = text[start:end]
+    if not core or not any(ch.isdigit() for ch in core) or any(ch not in _NUMERIC_CHARS for ch in core):
+        return None
+    return start, end
+
+
+def find_aadhaar_spans(tokens: list) -> tuple:
+    """Find valid Aadhaar numbers in one pass over the tokens and return (spans, candidate_count).
+
+    A candidate is any run of consecutive number tokens holding exactly 12 digits, so numbers split
+    across tokens or lines are found as well as single `dddd dddd dddd` or 12-digit tokens. All
+    candidates (after OCR-confusion repair) are checksum-validated in one batch. Each span is a dict
+    with the `number`, the `token_indexes` it covers and the `boxes` to mask (first 8 digits), which
+    is empty when the OCR gave no position for them.
+    """
+    cores = [_numeric_core(text) for text, _ in tokens]
+
+    windows = []
+    numbers = []
+    for first in range(len(tokens)):
+        if cores[first] is None:
+            continue
+        digits = 0
+        for last in range(first, len(tokens)):
+            if cores[last] is None:
+                break
+            start, end = cores[last]
+            digits += end - start
+            if digits > AADHAAR_DIGITS:
+                break
+            if digits == AADHAAR_DIGITS:
+                raw = "".join(tokens[i][0][cores[i][0]:cores[i][1]] for i in range(first, last + 1))
+                windows.append((first, last))
+                numbers.append(verhoeff.repair_digits(raw))
+                break
+
+    spans = []
+    taken = set()
+    for (first, last), number, valid in zip(windows, numbers, verhoeff.validate_batch(numbers)):
+        indexes = range(first, last + 1)
+        if not valid or taken.intersection(indexes):
+            continue
+        taken.update(indexes)
+        spans.append({"number": number, "token_indexes": list(indexes), "boxes": _mask_boxes(tokens, cores, indexes)})
+
+    return spans, len(windows)
+
+
+def _mask_boxes(tokens: list, cores: list, indexes) -> list:
+    """Boxes covering the first MASKED_DIGITS digits of a span, cut at character level inside tokens.
+
+    Empty when any of those digits has no box, since a partial mask would leave them readable.
+    """
+    boxes = []
+    remaining = MASKED_DIGITS
+    for i in indexes:
+        if remaining <= 0:
+            break
+        text, bbox = tokens[i]
+        start, end = cores[i]
+        take = min(remaining, end - start)
+        box = bbox if take == len(text) else _sub_box(bbox, len(text), start, start + take)
+        if not box:
+            return []
+        boxes.append(tuple(box))
+        remaining -= take
+    return boxes
+
+
+def match_page(page: dict) -> tuple:
+    """Convenience wrapper: (spans, candidate_count) for an OCR page dict."""
+    return find_aadhaar_spans(page_tokens(page))
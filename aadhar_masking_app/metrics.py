@@ -0,0 +1,65 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess,
+)
+
+
+# Stage latencies go from sub-millisecond (match) to minutes (model calls on large bundles)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "aadhaar_stage_seconds", "Time spent in each masking stage", ["stage"], buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "aadhaar_request_seconds", "End-to-end request latency", ["endpoint", "status"], buckets=STAGE_BUCKETS
+)
+PAGES = Counter("aadhaar_pages_total", "Pages processed, by where their text came from", ["source"])
+CACHE_LOOKUPS = Counter("aadhaar_ocr_cache_lookups_total", "OCR cache lookups", ["result"])
+CHECKSUM_FAILURES = Counter("aadhaar_checksum_failures_total", "Pages with Aadhaar-shaped numbers failing Verhoeff")
+MODEL_ERRORS = Counter("aadhaar_model_errors_total", "Failed or unparseable vision-model calls")
+ESCALATIONS = Counter("aadhaar_ocr_escalations_total", "Pages rejected by an OCR backend and passed on", ["backend"])
+IN_FLIGHT = Gauge("aadhaar_in_flight", "Work currently in flight", ["kind"], multiprocess_mode="livesum")
+
+_local = threading.local()
+
+
+@contextmanager
+def timed(stage: str):
+    """Observe the block's duration in STAGE_SECONDS and in the per-request timings, if collecting."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage).observe(elapsed)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+@contextmanager
+def collect_timings():
+    """Collect per-stage seconds for the work done on this thread inside the block into a dict."""
+    previous = getattr(_local, "timings", None)
+    _local.timings = {}
+    try:
+        yield _local.timings
+    finally:
+        _local.timings = previous
+
+
+def server_timing(timings: dict) -> str:
+    """Format stage timings as a Server-Timing header value (milliseconds)."""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def render_latest():
+    """Prometheus exposition of all metrics; aggregates worker processes when PROMETHEUS_MULTIPROC_DIR is set."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,88 @@
+import os
+import asyncio
+import threading
+import httpx
+
+
+class ModelClient:
+    """Client for the Ollama chat API with persistent connections and bounded concurrency.
+
+    Requests run on a private event loop thread that owns one pooled `httpx.AsyncClient`, so
+    synchronous callers (pool workers, scripts) and async callers share the same connections
+    and the same concurrency limit. Point `host` at a stub server to run without Ollama.
+    """
+
+    def __init__(self, host: str = None, max_concurrency: int = None, timeout: float = 300.0, keep_alive=None):
+        self.host = host or os.getenv("OLLAMA_HOST", "http://localhost:11434")
+        self.max_concurrency = max_concurrency or int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4"))
+        self.timeout = timeout
+        # How long Ollama keeps the model resident after each call ("30m", or seconds; -1 = forever)
+        keep_alive = keep_alive if keep_alive is not None else os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        self.keep_alive = int(keep_alive) if str(keep_alive).lstrip("-").isdigit() else keep_alive
+        self._client = None
+        self._slots = None
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="model-client", daemon=True)
+        self._thread.start()
+
+    async def _post_chat(self, payload: dict) -> dict:
+        # Created lazily on the client loop; only that thread touches them, so no lock is needed.
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency
+            )
+            self._client = httpx.AsyncClient(base_url=self.host, timeout=self.timeout, limits=limits)
+            self._slots = asyncio.Semaphore(self.max_concurrency)
+        async with self._slots:
+            response = await self._client.post("/api/chat", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def submit(self, model: str, messages: list, **options):
+        """Start a chat call without waiting; returns a `concurrent.futures.Future` of the response dict."""
+        payload = {"model": model, "messages": messages, "stream": False, "keep_alive": self.keep_alive, **options}
+        return asyncio.run_coroutine_threadsafe(self._post_chat(payload), self._loop)
+
+    def chat(self, model: str, messages: list, **options) -> dict:
+        """Blocking chat call; returns the Ollama response dict."""
+        return self.submit(model, messages, **options).result()
+
+    def preload(self, model: str) -> dict:
+        """Load `model` into memory without generating anything (an empty chat), keeping it for `keep_alive`."""
+        return self.chat(model, [])
+
+    def chat_many(self, requests: list) -> list:
+        """Send several chat requests concurrently; each item is a `(model, messages, options)` tuple.
+
+        Results come back in request order. Concurrency is still capped by `max_concurrency`.
+        """
+        futures = [self.submit(model, messages, **(options or {})) for model, messages, options in requests]
+        return [future.result() for future in futures]
+
+    async def achat(self, model: str, messages: list, **options) -> dict:
+        """Awaitable chat call usable from any event loop."""
+        return await asyncio.wrap_future(self.submit(model, messages, **options))
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+            self._client = None
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+
+_default_client = None
+_default_pid = None
+_default_lock = threading.Lock()
+
+
+def get_client() -> ModelClient:
+    """Return the process-wide ModelClient, configured from OLLAMA_HOST / OLLAMA_MAX_CONCURRENCY."""
+    global _default_client, _default_pid
+    # A forked worker inherits the object but not its loop thread, so it must build its own.
+    if _default_client is None or _default_pid != os.getpid():
+        with _default_lock:
+            if _default_client is None or _default_pid != os.getpid():
+                _default_client = ModelClient()
+                _default_pid = os.getpid()
+    return _default_client
@@ -0,0 +1,198 @@
+import os
+import json
+import numpy as np
+from encoding import ImageEncoder
+from model_client import get_client
+import matcher
+import metrics
+from paddle_engine import get_paddle_ocr
+
+
+class OCRBackend:
+    """One OCR engine behind a common interface: a PIL page image in, an OCR page dict out.
+
+    Pages have the same shape as the vision model's output, `{"lines": [...], "words": [...]}`,
+    where each item has `content`, a `bbox` in the input image's pixels and a `confidence` in 0..1
+    (None when the engine reports none). `cost` orders backends from cheapest to most expensive.
+    """
+
+    name = "base"
+    cost = 0
+
+    def recognize(self, img) -> dict:
+        raise NotImplementedError
+
+
+class TesseractBackend(OCRBackend):
+    """Tesseract via pytesseract; word boxes and confidences from `image_to_data`."""
+
+    name = "tesseract"
+    cost = 1
+
+    def __init__(self, lang: str = "eng", config: str = ""):
+        import pytesseract  # Optional dependency, only needed when this backend is enabled
+        self._tesseract = pytesseract
+        self.lang = lang
+        self.config = config
+
+    def recognize(self, img) -> dict:
+        data = self._tesseract.image_to_data(
+            img, lang=self.lang, config=self.config, output_type=self._tesseract.Output.DICT
+        )
+        words = []
+        lines = {}
+        for i, text in enumerate(data["text"]):
+            text = text.strip()
+            conf = float(data["conf"][i])
+            if not text or conf < 0:
+                continue
+            x0, y0 = data["left"][i], data["top"][i]
+            word = {
+                "content": text,
+                "bbox": [x0, y0, x0 + data["width"][i], y0 + data["height"][i]],
+                "confidence": conf / 100,
+            }
+            words.append(word)
+            lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(word)
+        return {"lines": [_merge_line(line) for line in lines.values()], "words": words}
+
+
+class PaddleBackend(OCRBackend):
+    """PaddleOCR; it reports text lines, which the matcher splits into tokens itself."""
+
+    name = "paddle"
+    cost = 2
+
+    def __init__(self, ocr=None):
+        self.ocr = ocr or get_paddle_ocr()  # Any object with PaddleOCR's .ocr(); shared per thread by default
+
+    def recognize(self, img) -> dict:
+        array = np.asarray(img.convert("RGB"))[:, :, ::-1]  # PaddleOCR expects BGR like cv2.imread
+        lines = []
+        for res in self.ocr.ocr(array) or []:
+            for points, (text, conf) in res or []:
+                xs = [x for x, _ in points]
+                ys = [y for _, y in points]
+                lines.append({"content": text, "bbox": [min(xs), min(ys), max(xs), max(ys)], "confidence": float(conf)})
+        return {"lines": lines}
+
+
+class LLMBackend(OCRBackend):
+    """The Ollama vision model: the most accurate and by far the slowest backend.
+
+    `submit` and `parse` split a call in two so callers can keep several pages in flight.
+    """
+
+    name = "llm"
+    cost = 10
+
+    def __init__(self, client=None, encoder=None, model: str = "llama3.2-vision",
+                 prompt: str = "Extract text and positions as JSON."):
+        self.client = client or get_client()
+        self.encoder = encoder or ImageEncoder()
+        self.model = model
+        self.prompt = prompt
+
+    def submit(self, img) -> tuple:
+        """Encode `img` and send it to the model; returns (future, scale)."""
+        with metrics.timed("encode"):
+            img_b64, scale = self.encoder.encode(img)
+        messages = [
+            {"role": "system", "content": self.prompt},
+            {"role": "user", "content": "", "images": [img_b64]},
+        ]
+        in_flight = metrics.IN_FLIGHT.labels("model")
+        in_flight.inc()
+        future = self.client.submit(self.model, messages, format="json")
+        future.add_done_callback(lambda _: in_flight.dec())
+        return future, scale
+
+    def parse(self, future, scale: float) -> dict:
+        """Wait for a submitted call and return its page with boxes in the submitted image's pixels."""
+        try:
+            with metrics.timed("model"):
+                page = json.loads(future.result()["message"]["content"])
+        except Exception:
+            metrics.MODEL_ERRORS.inc()
+            raise
+        # The model saw a downsampled copy; map its boxes back
+        return self.encoder.rescale_boxes(page, 1 / scale)
+
+    def recognize(self, img) -> dict:
+        return self.parse(*self.submit(img))
+
+
+# Engines the router may run before the model. The model itself is not one of them: AadharMask
+# sends the pages the router rejects to it asynchronously, so routing it too would call it twice.
+BACKENDS = {"tesseract": TesseractBackend, "paddle": PaddleBackend}
+
+
+def _merge_line(words: list) -> dict:
+    boxes = [word["bbox"] for word in words]
+    return {
+        "content": " ".join(word["content"] for word in words),
+        "bbox": [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)],
+        "confidence": sum(word["confidence"] for word in words) / len(words),
+    }
+
+
+def page_confidence(page: dict):
+    """Mean confidence of the page's words (or lines), or None if the engine reported none."""
+    items = page.get("words") or page.get("lines") or []
+    scores = [item["confidence"] for item in items if item.get("confidence") is not None]
+    return sum(scores) / len(scores) if scores else None
+
+
+def has_valid_aadhaar(page: dict) -> bool:
+    """Default acceptance check: the page holds Verhoeff-valid Aadhaar numbers, all with boxes to mask."""
+    spans = matcher.match_page(page)[0]
+    return bool(spans) and all(span["boxes"] for span in spans)
+
+
+class OCRRouter:
+    """Run OCR backends cheapest first, escalating only when a page fails the acceptance check.
+
+    A page is accepted when `accept(page)` holds (by default: a valid Aadhaar number was found) and
+    the engine's mean confidence is at least `min_confidence`. Accepted pages carry the backend
+    name under "source".
+    """
+
+    def __init__(self, backends: list, min_confidence: float = 0.8, accept=has_valid_aadhaar):
+        self.backends = sorted(backends, key=lambda backend: backend.cost)
+        self.min_confidence = min_confidence
+        self.accept = accept
+
+    def accepts(self, page: dict) -> bool:
+        confidence = page_confidence(page)
+        if confidence is not None and confidence < self.min_confidence:
+            return False
+        return self.accept(page)
+
+    def cascade(self, img) -> tuple:
+        """Return (page, accepted): the first accepted page, else the most expensive backend's page."""
+        page = None
+        for backend in self.backends:
+            with metrics.timed(f"ocr_{backend.name}"):
+                page = backend.recognize(img)
+            page["source"] = backend.name
+            if self.accepts(page):
+                return page, True
+            metrics.ESCALATIONS.labels(backend.name).inc()
+        return page, False
+
+    def recognize(self, img) -> dict:
+        return self.cascade(img)[0]
+
+
+def router_from_env():
+    """OCRRouter for the local backends named in MASK_OCR_BACKENDS (e.g. "tesseract,paddle"), or None."""
+    names = [name.strip() for name in os.getenv("MASK_OCR_BACKENDS", "").split(",") if name.strip()]
+    if not names:
+        return None
+    unknown = [name for name in names if name not in BACKENDS]
+    if unknown:
+        raise ValueError(f"Unknown OCR backends: {', '.join(unknown)} (choose from {', '.join(BACKENDS)})")
+    return OCRRouter(
+        [BACKENDS[name]() for name in names],
+        min_confidence=float(os.getenv("MASK_OCR_MIN_CONFIDENCE", "0.8")),
+    )
@@ -0,0 +1,20 @@
+import os
+import threading
+
+
+_paddle = threading.local()
+
+
+def get_paddle_ocr():
+    """Return this thread's PaddleOCR engine, loading its models on first use only.
+
+    Shared by PaddleBackend and the Under_Development extractors, so a thread holds one copy.
+    Paddle predictors are not thread-safe, so each thread of a thread pool gets its own; a process
+    pool worker has one thread and so one engine. Kept free of the service's other dependencies,
+    so standalone scripts can import it with only PaddleOCR installed.
+    """
+    if getattr(_paddle, "pid", None) != os.getpid():
+        from paddleocr import PaddleOCR  # Optional, heavy dependency; deferred until an engine is needed
+        _paddle.ocr = PaddleOCR(use_angle_cls=True, lang="en")
+        _paddle.pid = os.getpid()
+    return _paddle.ocr
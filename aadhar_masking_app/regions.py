@@ -0,0 +1,129 @@
+import cv2
+import numpy as np
+from PIL import Image
+
+
+class NumberRegionDetector:
+    """Propose the few page regions likely to hold an ID number, so only they go to the recognizer.
+
+    Text is found with a morphological gradient and Otsu threshold, characters are merged into
+    lines with a wide closing kernel, and the line boxes are kept when they have the shape of a
+    `dddd dddd dddd` band. An empty proposal list means "not confident": OCR the full page, as
+    does a best proposal scoring below `min_confidence` whose crops turn out to hold no number.
+    """
+
+    def __init__(self, min_aspect: float = 4.0, max_aspect: float = 18.0, min_height_ratio: float = 0.008,
+                 max_height_ratio: float = 0.12, min_fill: float = 0.25, max_regions: int = 6,
+                 padding: float = 0.35, work_side: int = 1200, min_confidence: float = 0.5):
+        self.min_aspect = min_aspect
+        self.max_aspect = max_aspect
+        self.min_height_ratio = min_height_ratio
+        self.max_height_ratio = max_height_ratio
+        self.min_fill = min_fill
+        self.max_regions = max_regions
+        self.padding = padding
+        self.work_side = work_side
+        self.min_confidence = min_confidence
+
+    @staticmethod
+    def to_gray(image) -> np.ndarray:
+        """Grayscale uint8 array from a PIL image or a gray/BGR(A) NumPy array."""
+        if isinstance(image, Image.Image):
+            return np.asarray(image.convert("L"))
+        image = np.asarray(image, dtype=np.uint8)
+        if image.ndim == 3:
+            code = cv2.COLOR_BGRA2GRAY if image.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+            return cv2.cvtColor(np.ascontiguousarray(image), code)
+        return image
+
+    def propose(self, image) -> list:
+        """Return up to max_regions (x0, y0, x1, y1) boxes in `image` pixels, best first."""
+        return [box for _, box in self.candidates(image)[:self.max_regions]]
+
+    def is_confident(self, scored: list) -> bool:
+        """Whether (score, box) proposals from `candidates` include a clear number band."""
+        return bool(scored) and scored[0][0] >= self.min_confidence
+
+    def score(self, image) -> float:
+        """Cheap likelihood that a page carries an ID number: summed score of its best candidate bands."""
+        return sum(score for score, _ in self.candidates(image)[:self.max_regions])
+
+    def candidates(self, image) -> list:
+        """All number-shaped text bands as (score, (x0, y0, x1, y1)) in `image` pixels, best first."""
+        gray = self.to_gray(image)
+        full_h, full_w = gray.shape[:2]
+        # Proposals only need to be approximate, so work on a small copy
+        scale = min(1.0, self.work_side / max(full_h, full_w))
+        if scale < 1.0:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        h, w = gray.shape[:2]
+
+        gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3)))
+        _, binary = cv2.threshold(gradient, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+        line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (max(9, w // 60), 1))
+        lines = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, line_kernel)
+        contours, _ = cv2.findContours(lines, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+        candidates = []
+        for contour in contours:
+            x, y, box_w, box_h = cv2.boundingRect(contour)
+            if not h * self.min_height_ratio <= box_h <= h * self.max_height_ratio:
+                continue
+            aspect = box_w / box_h
+            if not self.min_aspect <= aspect <= self.max_aspect:
+                continue
+            fill = cv2.countNonZero(binary[y:y + box_h, x:x + box_w]) / float(box_w * box_h)
+            if fill < self.min_fill:
+                continue
+            # A 12-digit band with two gaps is roughly 8-10x as wide as it is tall
+            score = fill / (1.0 + abs(np.log(aspect / 9.0)))
+            candidates.append((score, x, y, box_w, box_h))
+
+        candidates.sort(reverse=True)
+        scored = []
+        for score, x, y, box_w, box_h in candidates:
+            pad = box_h * self.padding
+            scored.append((score, (
+                max(0, int((x - pad) / scale)),
+                max(0, int((y - pad) / scale)),
+                min(full_w, int((x + box_w + pad) / scale) + 1),
+                min(full_h, int((y + box_h + pad) / scale) + 1),
+            )))
+        return scored
+
+    @staticmethod
+    def stack_regions(img, boxes: list, gap: int = 12):
+        """Stack PIL crops of `boxes` vertically into one image; returns (mosaic, layout).
+
+        `layout` holds (mosaic_y, box) per strip and is what `unstack_page` needs to map the
+        recognizer's boxes back onto the original page.
+        """
+        crops = [img.crop(box) for box in boxes]
+        width = max(crop.width for crop in crops)
+        height = sum(crop.height for crop in crops) + gap * (len(crops) - 1)
+        mosaic = Image.new(img.mode if img.mode in ("RGB", "L") else "RGB", (width, height), "white")
+        layout = []
+        y = 0
+        for crop, box in zip(crops, boxes):
+            mosaic.paste(crop, (0, y))
+            layout.append((y, box))
+            y += crop.height + gap
+            crop.close()
+        return mosaic, layout
+
+    @staticmethod
+    def unstack_page(page: dict, layout: list) -> dict:
+        """Translate word/line bboxes on a stacked mosaic back to page coordinates, in place."""
+        for key in ("words", "lines"):
+            for item in page.get(key, []):
+                bbox = item.get("bbox")
+                if not bbox:
+                    continue
+                center_y = (bbox[1] + bbox[3]) / 2
+                strip_y, box = layout[0]
+                for candidate_y, candidate_box in layout:
+                    if candidate_y <= center_y:
+                        strip_y, box = candidate_y, candidate_box
+                dx, dy = box[0], box[1] - strip_y
+                item["bbox"] = [bbox[0] + dx, bbox[1] + dy, bbox[2] + dx, bbox[3] + dy]
+        return page
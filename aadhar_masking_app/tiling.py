@@ -0,0 +1,187 @@
+import zlib
+import struct
+import tempfile
+from io import BytesIO
+import numpy as np
+from PIL import Image
+import matcher
+from errors import ImageTooLarge
+
+
+class TiledImage:
+    """Region-by-region access to an image too large to hold in memory as a whole.
+
+    Uncompressed RGB/L images (e.g. raw TIFF, PPM) are read straight from the file bytes through a
+    NumPy view, so nothing is decoded until a region is asked for. Other formats have no random
+    access in Pillow: they are decoded once and spooled band by band, as RGB, into a disk-backed
+    memmap, after which every region read touches only its own rows.
+    """
+
+    SPOOL_BAND_BYTES = 64 * 2 ** 20
+
+    def __init__(self, source):
+        """`source` is a file path or the raw file bytes."""
+        self._spool_file = None
+        img = Image.open(source if isinstance(source, str) else BytesIO(source))
+        self.width, self.height = img.size
+        array = self._raw_view(img, source)
+        if array is None:
+            array = self._spool(img)
+        img.close()  # Drops the decoded frame; from here on only requested regions are in memory
+        self._array = array
+
+    @classmethod
+    def check(cls, img, source, budget: int):
+        """Raise ImageTooLarge if reading the opened `img` needs more than `budget` bytes.
+
+        Uncompressed images are read in place at any size. Any other format is decoded whole once
+        before spooling, so its single frame must fit (Pillow keeps multi-band pixels in 4 bytes).
+        """
+        if cls._raw_view(img, source) is not None:
+            return
+        decoded = img.width * img.height * (1 if img.mode in ("1", "L", "P") else 4)
+        if decoded > budget:
+            raise ImageTooLarge(
+                f"{img.width}x{img.height} image needs {decoded >> 20} MB to decode, over the {budget >> 20} MB budget"
+            )
+
+    @staticmethod
+    def _raw_view(img, source):
+        if len(img.tile) != 1:
+            return None
+        codec, extents, offset, args = img.tile[0]
+        if isinstance(args, str):
+            args = (args, 0, 1)
+        bands = {"RGB": 3, "L": 1}.get(img.mode)
+        if codec != "raw" or tuple(extents) != (0, 0, *img.size) or bands is None:
+            return None
+        rawmode, stride, orientation = (tuple(args) + (0, 1))[:3]
+        row_bytes = img.width * bands
+        if rawmode != img.mode or orientation != 1 or stride not in (0, row_bytes):
+            return None
+        shape = (img.height, img.width, bands)
+        if isinstance(source, str):
+            return np.memmap(source, dtype=np.uint8, mode="r", offset=offset, shape=shape)
+        return np.frombuffer(source, dtype=np.uint8, count=img.height * row_bytes, offset=offset).reshape(shape)
+
+    def _spool(self, img):
+        # Plain writes rather than a writable memmap: dirty mapped pages would count against the
+        # process on top of the decoded frame, while the read-only map below is clean page cache.
+        self._spool_file = tempfile.TemporaryFile()
+        rows = max(1, self.SPOOL_BAND_BYTES // (self.width * 3))
+        for y0 in range(0, self.height, rows):
+            y1 = min(y0 + rows, self.height)
+            with img.crop((0, y0, self.width, y1)) as band, band.convert("RGB") as rgb:
+                self._spool_file.write(rgb.tobytes())
+        self._spool_file.flush()
+        return np.memmap(self._spool_file, dtype=np.uint8, mode="r", shape=(self.height, self.width, 3))
+
+    def read(self, box):
+        """The (x0, y0, x1, y1) region as a new RGB image."""
+        x0, y0, x1, y1 = box
+        region = np.ascontiguousarray(self._array[y0:y1, x0:x1])
+        if region.shape[2] == 1:
+            with Image.fromarray(region[:, :, 0]) as gray:
+                return gray.convert("RGB")
+        return Image.fromarray(region)
+
+    def close(self):
+        self._array = None
+        if self._spool_file is not None:
+            self._spool_file.close()
+            self._spool_file = None
+
+
+def _spans(length: int, size: int, overlap: int) -> list:
+    """1-D tiling: ((start, end), (core_start, core_end)) per tile.
+
+    Cores split each overlap at its midpoint, so every point belongs to exactly one tile's core.
+    """
+    step = max(1, size - overlap)
+    spans = [(start, min(start + size, length)) for start in range(0, max(length - overlap, 1), step)]
+    result = []
+    for i, (start, end) in enumerate(spans):
+        core_start = 0 if i == 0 else (start + spans[i - 1][1]) / 2
+        core_end = length if i == len(spans) - 1 else (end + spans[i + 1][0]) / 2
+        result.append(((start, end), (core_start, core_end)))
+    return result
+
+
+def tile_grid(width: int, height: int, size: int, overlap: int) -> list:
+    """Overlapping tiles covering the image, as (box, core) pairs in reading order."""
+    return [
+        ((x0, y0, x1, y1), (cx0, cy0, cx1, cy1))
+        for (y0, y1), (cy0, cy1) in _spans(height, size, overlap)
+        for (x0, x1), (cx0, cx1) in _spans(width, size, overlap)
+    ]
+
+
+def merge_tile_pages(tiles: list) -> dict:
+    """Merge per-tile OCR pages, given as (page, box, core) triples, into one page in image pixels.
+
+    Each token is kept from the one tile whose core holds its centre, which drops the copies seen
+    in overlaps and the cut-off pieces at tile edges (as long as the overlap is wider than a word).
+    Tokens are then regrouped into lines and put back in reading order, so numbers that straddle
+    tile edges come out as consecutive tokens for the matcher.
+    """
+    tokens = []
+    for page, (x0, y0, _, _), (cx0, cy0, cx1, cy1) in tiles:
+        for text, bbox in matcher.page_tokens(page):
+            if not bbox:
+                continue
+            box = [bbox[0] + x0, bbox[1] + y0, bbox[2] + x0, bbox[3] + y0]
+            center_x, center_y = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            if cx0 <= center_x < cx1 and cy0 <= center_y < cy1:
+                tokens.append({"content": text, "bbox": box})
+
+    lines = []
+    for token in sorted(tokens, key=lambda t: (t["bbox"][1] + t["bbox"][3]) / 2):
+        center_y = (token["bbox"][1] + token["bbox"][3]) / 2
+        height = token["bbox"][3] - token["bbox"][1]
+        if lines and abs(center_y - lines[-1]["center_y"]) <= max(height, lines[-1]["height"]) / 2:
+            lines[-1]["tokens"].append(token)
+        else:
+            lines.append({"center_y": center_y, "height": height, "tokens": [token]})
+
+    words = []
+    page_lines = []
+    for line in lines:
+        line_tokens = sorted(line["tokens"], key=lambda t: t["bbox"][0])
+        words.extend(line_tokens)
+        boxes = [t["bbox"] for t in line_tokens]
+        page_lines.append({
+            "content": " ".join(t["content"] for t in line_tokens),
+            "bbox": [min(b[0] for b in boxes), min(b[1] for b in boxes), max(b[2] for b in boxes), max(b[3] for b in boxes)],
+        })
+    return {"lines": page_lines, "words": words}
+
+
+class PNGWriter:
+    """Write an 8-bit RGB PNG band by band; only the compressed stream is ever held in full."""
+
+    def __init__(self, out, width: int, height: int, level: int = 6):
+        self.out = out
+        self.width = width
+        self._compressor = zlib.compressobj(level)
+        out.write(b"\x89PNG\r\n\x1a\n")
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+
+    def _chunk(self, kind: bytes, data: bytes):
+        self.out.write(struct.pack(">I", len(data)) + kind + data)
+        self.out.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xFFFFFFFF))
+
+    def write(self, band):
+        """Append the rows of an RGB image (or HxWx3 uint8 array) `width` pixels wide."""
+        rows = np.asarray(band, dtype=np.uint8).reshape(-1, self.width * 3)
+        # "Sub" filter (each byte minus the same channel of the pixel to its left) compresses scans well
+        filtered = np.empty((rows.shape[0], rows.shape[1] + 1), dtype=np.uint8)
+        filtered[:, 0] = 1
+        filtered[:, 1:4] = rows[:, :3]
+        np.subtract(rows[:, 3:], rows[:, :-3], out=filtered[:, 4:])
+        data = self._compressor.compress(filtered.tobytes())
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self._compressor.flush())
+        self._chunk(b"IEND", b"")
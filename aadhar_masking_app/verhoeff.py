@@ -0,0 +1,102 @@
+import re
+import numpy as np
+
+
+MULTIPLICATION_TABLE = np.array((
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 2, 3, 4, 0, 6, 7, 8, 9, 5),
+    (2, 3, 4, 0, 1, 7, 8, 9, 5, 6),
+    (3, 4, 0, 1, 2, 8, 9, 5, 6, 7),
+    (4, 0, 1, 2, 3, 9, 5, 6, 7, 8),
+    (5, 9, 8, 7, 6, 0, 4, 3, 2, 1),
+    (6, 5, 9, 8, 7, 1, 0, 4, 3, 2),
+    (7, 6, 5, 9, 8, 2, 1, 0, 4, 3),
+    (8, 7, 6, 5, 9, 3, 2, 1, 0, 4),
+    (9, 8, 7, 6, 5, 4, 3, 2, 1, 0),
+), dtype=np.uint8)
+
+PERMUTATION_TABLE = np.array((
+    (0, 1, 2, 3, 4, 5, 6, 7, 8, 9),
+    (1, 5, 7, 6, 2, 8, 3, 0, 9, 4),
+    (5, 8, 0, 3, 7, 9, 6, 1, 4, 2),
+    (8, 9, 1, 6, 0, 4, 3, 5, 2, 7),
+    (9, 4, 5, 3, 1, 2, 6, 8, 7, 0),
+    (4, 2, 8, 6, 5, 7, 3, 9, 0, 1),
+    (2, 7, 9, 3, 8, 0, 6, 4, 1, 5),
+    (7, 0, 4, 6, 9, 1, 3, 2, 5, 8),
+), dtype=np.uint8)
+
+# Characters OCR engines commonly return in place of a digit, and the digit each stands for
+OCR_CONFUSIONS = {
+    "O": "0", "o": "0", "D": "0",
+    "l": "1", "I": "1", "i": "1", "|": "1",
+    "S": "5", "s": "5",
+    "B": "8",
+}
+_REPAIR_TABLE = str.maketrans({**OCR_CONFUSIONS, " ": None})
+
+# Plain tuples are faster than NumPy indexing for one-off checks
+_MULTIPLICATION = tuple(map(tuple, MULTIPLICATION_TABLE.tolist()))
+_PERMUTATION = tuple(map(tuple, PERMUTATION_TABLE.tolist()))
+
+_CONFUSABLE = "[0-9" + re.escape("".join(OCR_CONFUSIONS)) + "]"
+# Four digits or confusable characters, at least one a real digit: letters alone (ruling, barcodes) never count
+_GROUP = rf"(?={_CONFUSABLE}{{0,3}}[0-9]){_CONFUSABLE}{{4}}"
+# One pass over the text finds every dddd dddd dddd shaped run, confusable characters included.
+# The lookahead lets runs overlap, so "1990 1234 5678 9012" also yields the run starting at 1234.
+CANDIDATE_PATTERN = re.compile(rf"(?<![0-9A-Za-z|])(?=({_GROUP} ?{_GROUP} ?{_GROUP})(?![0-9A-Za-z|]))")
+
+
+def checksum(number: str) -> int:
+    """Verhoeff checksum of a digit string; 0 means the number is valid."""
+    c = 0
+    for i, n in enumerate(int(d) for d in reversed(number)):
+        c = _MULTIPLICATION[c][_PERMUTATION[i & 7][n]]
+    return c
+
+
+def validate_batch(numbers) -> np.ndarray:
+    """Validate many equal-length digit strings (or an (N, L) digit array) at once; returns a bool array."""
+    if isinstance(numbers, np.ndarray):
+        digits = numbers.astype(np.uint8, copy=False)
+    else:
+        if len(numbers) == 0:
+            return np.zeros(0, dtype=bool)
+        joined = "".join(numbers).encode("ascii")
+        digits = (np.frombuffer(joined, dtype=np.uint8) - ord("0")).reshape(len(numbers), -1)
+
+    c = np.zeros(digits.shape[0], dtype=np.uint8)
+    # Walk the digit columns right to left; each step is one table lookup for every candidate
+    for i, column in enumerate(digits[:, ::-1].T):
+        c = MULTIPLICATION_TABLE[c, PERMUTATION_TABLE[i & 7, column]]
+    return c == 0
+
+
+def repair_digits(raw: str) -> str:
+    """The digit string `raw` stands for under OCR_CONFUSIONS, spaces dropped."""
+    return raw.translate(_REPAIR_TABLE)
+
+
+def find_candidates(text: str) -> list:
+    """Every Aadhaar-shaped run in `text` as (start, end, raw) tuples, in one regex pass."""
+    return [(m.start(), m.start() + len(m.group(1)), m.group(1)) for m in CANDIDATE_PATTERN.finditer(text)]
+
+
+def find_valid_numbers(texts: list) -> list:
+    """For each text, the (start, end, raw, number) of candidates with a valid checksum after repair.
+
+    Candidates from all texts are repaired and validated in a single batch, so this scales to
+    bulk audits over many stored transcripts.
+    """
+    owners = []
+    numbers = []
+    for text_index, text in enumerate(texts):
+        for start, end, raw in find_candidates(text):
+            owners.append((text_index, start, end, raw))
+            numbers.append(repair_digits(raw))
+
+    results = [[] for _ in texts]
+    for (text_index, start, end, raw), number, valid in zip(owners, numbers, validate_batch(numbers)):
+        if valid:
+            results[text_index].append((start, end, raw, number))
+    return results
@@ -0,0 +1,115 @@
+import os
+import time
+import asyncio
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from cache import OCRCache
+import metrics
+
+
+_local = threading.local()  # This thread's masker
+_cache = None
+_cache_pid = None
+_cache_lock = threading.Lock()
+
+
+def cache_from_env() -> OCRCache:
+    """Build the OCR cache from the OCR_CACHE_* environment variables."""
+    return OCRCache(
+        max_entries=int(os.getenv("OCR_CACHE_SIZE", "256")),
+        db_path=os.getenv("OCR_CACHE_DB") or None,
+        max_disk_entries=int(os.getenv("OCR_CACHE_DISK_SIZE", "10000")),
+        ttl=float(os.getenv("OCR_CACHE_TTL")) if os.getenv("OCR_CACHE_TTL") else None,
+    )
+
+
+def get_cache() -> OCRCache:
+    """Return this process's OCR cache, shared by all of its threads."""
+    global _cache, _cache_pid
+    if _cache is None or _cache_pid != os.getpid():
+        with _cache_lock:
+            if _cache is None or _cache_pid != os.getpid():
+                _cache = cache_from_env()
+                _cache_pid = os.getpid()
+    return _cache
+
+
+def get_masker():
+    """Return this thread's AadharMask, creating it on first use.
+
+    Each thread gets its own masker and OCR engines, since those are not safe to share between
+    threads; a process pool worker has one thread, so that is one per process. fitz, OpenCV and the
+    OCR engines are imported here rather than at module load, so the API process starts quickly and
+    only pool workers that actually mask pay for them.
+    """
+    if getattr(_local, "pid", None) != os.getpid():
+        from masking import AadharMask
+        from regions import NumberRegionDetector
+        from ocr_backends import router_from_env
+
+        region_detector = NumberRegionDetector() if os.getenv("MASK_REGION_CROP", "1") == "1" else None
+        _local.masker = AadharMask(cache=get_cache(), region_detector=region_detector, router=router_from_env())
+        _local.pid = os.getpid()
+    return _local.masker
+
+
+def mask_document(data: bytes, file_ext: str, with_timings: bool = False, raw_output: bool = False) -> dict:
+    """Mask one uploaded document; runs inside a pool worker.
+
+    With `with_timings` the per-stage seconds spent on this document are returned under "timings";
+    with `raw_output` the masked file comes back as bytes instead of base64 (see mask_aadhar_final).
+    """
+    with metrics.collect_timings() as timings:
+        result = get_masker().mask_aadhar_final(data, file_ext=file_ext, raw_output=raw_output)
+    if with_timings:
+        result["timings"] = timings
+    return result
+
+
+def cache_stats() -> dict:
+    """This process's OCR cache counters; runs inside a pool worker."""
+    return get_cache().stats()
+
+
+def warm_up() -> float:
+    """Load this process's engines and push one synthetic page through the whole pipeline.
+
+    The vision model is loaded into Ollama first, so the first real request does not pay for it.
+    Returns the seconds taken.
+    """
+    from PIL import Image, ImageDraw
+
+    start = time.perf_counter()
+    masker = get_masker()
+    masker.client.preload(masker.model_name)
+    img = Image.new("RGB", (640, 200), "white")
+    ImageDraw.Draw(img).text((40, 90), "GOVERNMENT OF INDIA  2345 6789 0123", fill="black")
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    masker.mask_aadhar_final(buffered.getvalue(), file_ext=".png")
+    return time.perf_counter() - start
+
+
+class MaskingPool:
+    """Runs masking jobs off the event loop on a thread or process pool with a bounded number in flight."""
+
+    def __init__(self, kind: str = "process", max_workers: int = None, max_in_flight: int = None, initializer=None):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.kind = kind
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        executor_cls = ProcessPoolExecutor if kind == "process" else ThreadPoolExecutor
+        # `initializer` runs once per worker as it starts, e.g. get_masker to load the engines up front
+        self.executor = executor_cls(max_workers=self.max_workers, initializer=initializer)
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+
+    async def run(self, func, *args):
+        """Run `func(*args)` on the pool once an in-flight slot is free."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, func, *args)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
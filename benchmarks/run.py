@@ -0,0 +1,325 @@
+"""Offline micro-benchmarks for the masking and extraction pipelines.
+
+Synthetic cards are rendered with PIL/fitz and OCR is answered by deterministic stubs, so the
+numbers measure this repo's own code: rendering, encoding, matching, masking and output encoding.
+Each scenario runs in a fresh process and reports that process's peak RSS, which (unlike
+tracemalloc) includes the pixel buffers PIL, OpenCV and MuPDF allocate.
+
+    python benchmarks/run.py                          # run everything, print a table
+    python benchmarks/run.py --save-baseline base.json
+    python benchmarks/run.py --baseline base.json     # compare; exit 1 on regressions
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import tempfile
+import contextlib
+import multiprocessing
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(ROOT, "aadhar_masking_app"))
+sys.path.append(os.path.join(ROOT, "Under_Development"))
+
+from io import BytesIO
+import verhoeff
+import matcher
+from masking import AadharMask
+from synthetic import render_card, card_pdf, card_tiff, bundle
+from stubs import StubModelClient, StubPaddleOCR, StubTesseract
+
+
+class StageTimer:
+    """Accumulates wall time per stage by wrapping methods on a live object."""
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+
+    def wrap(self, obj, attr: str, stage: str):
+        original = getattr(obj, attr)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.seconds[stage] += time.perf_counter() - start
+
+        setattr(obj, attr, timed)
+
+
+def instrumented_masker(cards: list):
+    """AadharMask on the stub model, with render/encode/ocr/match/mask/output stages timed."""
+    masker = AadharMask(client=StubModelClient(cards), use_text_layer=False)
+    timer = StageTimer()
+    timer.wrap(masker, "render_page", "render")
+    timer.wrap(masker.encoder, "encode", "encode")
+    timer.wrap(masker.client, "submit", "ocr")
+    timer.wrap(masker, "_finish_ocr", "ocr")
+    timer.wrap(masker, "match_page", "match")
+    timer.wrap(masker, "mask_aadhar_img", "mask")
+    timer.wrap(masker, "mask_aadhar_pdf_page", "mask")
+    timer.wrap(masker, "convert_img_to_b64", "output_encode")
+    timer.wrap(masker, "convert_pdf_to_b64", "output_encode")
+    return masker, timer
+
+
+def bench_aadhaar_image(runs: int):
+    cards = [render_card("aadhaar", random.Random(i), rotation=90 * (i % 4)) for i in range(4)]
+    payloads = []
+    for card in cards:
+        buffered = BytesIO()
+        card.image.save(buffered, format="PNG")
+        payloads.append(buffered.getvalue())
+    masker, timer = instrumented_masker(cards)
+
+    def run():
+        for data in payloads:
+            result = masker.mask_aadhar_final(data, file_ext=".png")
+            assert result["valid"], result["comments"]
+        return len(payloads)
+
+    return run, timer
+
+
+def bench_aadhaar_pdf_bundle(runs: int):
+    cards = bundle(pages=20, aadhaar_page=15)
+    data = card_pdf(cards, dpi=AadharMask.RENDER_DPI)
+    masker, timer = instrumented_masker(cards)
+
+    def run():
+        result = masker.mask_aadhar_final(data, file_ext=".pdf")
+        assert result["comments"][15] == "Aadhaar masked successfully", result["comments"]
+        return len(cards)
+
+    return run, timer
+
+
+def bench_verhoeff_batch(runs: int):
+    rng = random.Random(0)
+    numbers = ["".join(rng.choice("0123456789") for _ in range(12)) for _ in range(100_000)]
+    transcripts = [f"Name X DOB 01/01/1990 {n[:4]} {n[4:8]} {n[8:]} MALE" for n in numbers[:10_000]]
+    timer = StageTimer()
+
+    def run():
+        start = time.perf_counter()
+        verhoeff.validate_batch(numbers)
+        timer.seconds["validate_batch"] += time.perf_counter() - start
+        start = time.perf_counter()
+        verhoeff.find_valid_numbers(transcripts)
+        timer.seconds["find_valid_numbers"] += time.perf_counter() - start
+        return len(transcripts)
+
+    return run, timer
+
+
+def bench_matcher(runs: int):
+    pages = [render_card("aadhaar", random.Random(i)).page for i in range(200)]
+    timer = StageTimer()
+
+    def run():
+        start = time.perf_counter()
+        for page in pages:
+            spans, _ = matcher.match_page(page)
+            assert spans
+        timer.seconds["match"] += time.perf_counter() - start
+        return len(pages)
+
+    return run, timer
+
+
+def load_aadhar_fetch(tesseract):
+    """Under_Development's aadhar_fetch with `tesseract` standing in for pytesseract, or None if its
+    other dependencies (img2pdf, pdf2image, PyPDF2, tifftools) are not installed.
+    """
+    sys.modules["pytesseract"] = tesseract  # Scenarios run in their own process, so this does not leak
+    try:
+        import aadhar_masking
+    except ImportError:
+        return None
+    aadhar_masking.pytesseract = tesseract
+    return aadhar_masking.aadhar_fetch
+
+
+def bench_tiff_triage(runs: int):
+    cards = bundle(pages=25, aadhaar_page=18)
+    tesseract = StubTesseract(cards)
+    fetch_cls = load_aadhar_fetch(tesseract)
+    if fetch_cls is None:
+        return None, None
+    path = os.path.join(tempfile.mkdtemp(), "bundle.tif")
+    with open(path, "wb") as f:
+        f.write(card_tiff(cards))
+    fetch = fetch_cls(path)
+    timer = StageTimer()
+    timer.wrap(fetch, "rank_pages", "score")
+    timer.wrap(tesseract, "image_to_string", "ocr")
+
+    def run():
+        assert fetch.addhar_check(path) == 19
+        return len(cards)
+
+    return run, timer
+
+
+def bench_orientation(runs: int):
+    cards = [render_card("aadhaar", random.Random(i)) for i in range(4)]
+    tesseract = StubTesseract(cards)
+    fetch_cls = load_aadhar_fetch(tesseract)
+    if fetch_cls is None:
+        return None, None
+
+    class BenchFetch(fetch_cls):
+        """Stand-ins for helpers Extract_and_Mask_UIDs calls but this tree does not define."""
+
+        def image_processing(self, image_path):
+            return image_path
+
+        def Regex_Search(self, bounding_boxes):
+            chars = "".join(line.split(" ")[0] for line in bounding_boxes if line.strip())
+            return [run for run in re.findall(r"\d{12}", chars) if verhoeff.checksum(run) == 0]
+
+        def Mask_UIDs(self, image_path, possible_UIDs, bounding_boxes, rotation):
+            return image_path
+
+    folder = tempfile.mkdtemp()
+    paths = []
+    for i, card in enumerate(cards):
+        path = os.path.join(folder, f"card{i}.png")
+        with card.image.rotate(90 * i, expand=True) as rotated:  # Scanned sideways / upside down
+            rotated.save(path)
+        paths.append(path)
+    fetch = BenchFetch(paths[0])
+    timer = StageTimer()
+    timer.wrap(fetch, "estimate_orientation", "orientation")
+    timer.wrap(tesseract, "image_to_boxes", "boxes")
+
+    def run():
+        with contextlib.redirect_stdout(None):  # adhaar_read_data prints what it finds
+            for path in paths:
+                _, possible_UIDs, _ = fetch.Extract_and_Mask_UIDs(path)
+                assert possible_UIDs, path
+        return len(paths)
+
+    return run, timer
+
+
+def bench_document_extractor(runs: int):
+    try:
+        from pan_lic_vi import DocumentExtractor
+    except ImportError:
+        return None, None
+    cards = [render_card(kind, random.Random(i)) for i, kind in enumerate(["pan", "dl", "epic"] * 3)]
+    path = os.path.join(tempfile.mkdtemp(), "bundle.pdf")
+    with open(path, "wb") as f:
+        f.write(card_pdf(cards))
+    engine = StubPaddleOCR(cards)
+    timer = StageTimer()
+
+    def run():
+        extractor = DocumentExtractor(path, ocr=engine)
+        timer.wrap(extractor, "_ocr_page", "ocr")
+        start = time.perf_counter()
+        extractor.extract_all()
+        timer.seconds["extract_all"] += time.perf_counter() - start
+        return len(cards)
+
+    return run, timer
+
+
+BENCHMARKS = {
+    "aadhaar_image": bench_aadhaar_image,
+    "aadhaar_pdf_bundle": bench_aadhaar_pdf_bundle,
+    "verhoeff_batch": bench_verhoeff_batch,
+    "matcher": bench_matcher,
+    "tiff_triage": bench_tiff_triage,
+    "orientation": bench_orientation,
+    "document_extractor": bench_document_extractor,
+}
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024  # Bytes on macOS, KiB elsewhere
+
+
+def measure(name: str, runs: int) -> dict:
+    run, timer = BENCHMARKS[name](runs)
+    if run is None:
+        return None
+    run()  # Warm-up, not measured
+    timer.seconds.clear()
+
+    items = 0
+    start = time.perf_counter()
+    for _ in range(runs):
+        items += run()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "seconds_per_run": elapsed / runs,
+        "items_per_sec": items / elapsed if elapsed else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages_per_run": {stage: seconds / runs for stage, seconds in sorted(timer.seconds.items())},
+    }
+
+
+def measure_isolated(name: str, runs: int) -> dict:
+    """`measure` in a freshly spawned process, so its peak RSS belongs to this scenario alone."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return pool.submit(measure, name, runs).result()
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Print deltas against `baseline`; returns the names of scenarios slower than `tolerance` allows."""
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name]["seconds_per_run"]
+        change = (result["seconds_per_run"] - before) / before if before else 0.0
+        flag = "REGRESSION" if change > tolerance else ""
+        print(f"{name:<22} {before * 1000:>10.2f} ms -> {result['seconds_per_run'] * 1000:>10.2f} ms  {change:+7.1%} {flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("names", nargs="*", help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--save-baseline", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed slowdown before failing (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        result = measure_isolated(name, args.runs)
+        if result is None:
+            print(f"{name:<22} skipped (dependency not installed)")
+            continue
+        results[name] = result
+        stages = ", ".join(f"{stage}={seconds * 1000:.2f}ms" for stage, seconds in result["stages_per_run"].items())
+        print(f"{name:<22} {result['seconds_per_run'] * 1000:>10.2f} ms/run {result['items_per_sec']:>10.1f} items/s "
+              f"peak RSS {result['peak_rss_mb']:.0f} MB  [{stages}]")
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import copy
+import json
+import base64
+import hashlib
+import itertools
+from io import BytesIO
+from concurrent.futures import Future
+import cv2
+import numpy as np
+from PIL import Image
+from encoding import ImageEncoder
+
+
+class StubModelClient:
+    """Offline stand-in for ModelClient that answers each page with its ground truth.
+
+    Pages are answered in submission order (cycling, so repeated runs line up again). Boxes are
+    scaled to the size of the image actually sent, exactly as a real model would see them.
+    """
+
+    def __init__(self, cards: list):
+        self._cards = itertools.cycle(cards)
+
+    def submit(self, model: str, messages: list, **options) -> Future:
+        card = next(self._cards)
+        with Image.open(BytesIO(base64.b64decode(messages[-1]["images"][0]))) as sent:
+            scale = sent.width / card.image.width
+        page = ImageEncoder.rescale_boxes(copy.deepcopy(card.page), scale)
+        future = Future()
+        future.set_result({"message": {"role": "assistant", "content": json.dumps(page)}})
+        return future
+
+    def chat(self, model: str, messages: list, **options) -> dict:
+        return self.submit(model, messages, **options).result()
+
+
+class StubPaddleOCR:
+    """Offline stand-in for PaddleOCR.ocr returning ground-truth words in PaddleOCR's result format."""
+
+    def __init__(self, cards: list):
+        self._cards = itertools.cycle(cards)
+
+    def ocr(self, img, **kwargs):
+        card = next(self._cards)
+        width = img.shape[1] if hasattr(img, "shape") else card.image.width
+        scale = width / card.image.width
+        lines = []
+        for word in card.page["words"]:
+            x0, y0, x1, y1 = (value * scale for value in word["bbox"])
+            lines.append([[[x0, y0], [x1, y0], [x1, y1], [x0, y1]], (word["content"], 0.99)])
+        return [lines]
+
+
+class StubTesseract:
+    """Offline stand-in for the `pytesseract` module, answering from the ground truth of known cards.
+
+    Cards are recognised by their exact pixels (RGB or grayscale, in any of the four rotations);
+    crops are traced back to the frame they are a view of. Upright cards read as their text, rotated
+    ones only report their rotation to OSD, and anything else (e.g. blurred copies) reads as empty.
+    """
+
+    class TesseractError(Exception):
+        pass
+
+    class Output:
+        DICT = "dict"
+
+    def __init__(self, cards: list):
+        self._known = {}
+        for card in cards:
+            rgb = np.asarray(card.image.convert("RGB"))
+            # Frames as addhar_check reads them, and as cv2.imread + cvtColor gives them
+            for upright in (rgb, cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)):
+                for quarter_turns in range(4):
+                    self._known[self._fingerprint(np.rot90(upright, quarter_turns))] = (card, 90 * quarter_turns)
+
+    @staticmethod
+    def _fingerprint(array) -> str:
+        array = np.ascontiguousarray(array)
+        return hashlib.blake2b(f"{array.shape}".encode() + array.tobytes(), digest_size=16).hexdigest()
+
+    def _lookup(self, image):
+        array = np.asarray(image)
+        if isinstance(array.base, np.ndarray):  # A crop: look at the frame it was cut from
+            array = array.base
+        return self._known.get(self._fingerprint(array), (None, None))
+
+    def image_to_string(self, image, lang=None, config=""):
+        card, rotation = self._lookup(image)
+        if card is None or rotation:
+            return ""
+        return "\n".join(line["content"] for line in card.page["lines"]) + "\n"
+
+    def image_to_osd(self, image, output_type=None):
+        card, rotation = self._lookup(image)
+        if card is None:
+            raise self.TesseractError(1, "Too few characters")
+        return {"rotate": rotation, "orientation_conf": 10.0}
+
+    def image_to_boxes(self, image, lang=None, config=""):
+        """Tesseract's box format: one `char x0 y0 x1 y1 0` line per character, y measured from the bottom."""
+        card, rotation = self._lookup(image)
+        if card is None or rotation:
+            return ""
+        height = card.image.height
+        lines = []
+        for word in card.page["words"]:
+            x0, y0, x1, y1 = word["bbox"]
+            step = (x1 - x0) / len(word["content"])
+            for i, char in enumerate(word["content"]):
+                lines.append(f"{char} {int(x0 + i * step)} {height - y1} {int(x0 + (i + 1) * step)} {height - y0} 0")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,110 @@
+import random
+from io import BytesIO
+import fitz
+from PIL import Image, ImageDraw, ImageFont
+import verhoeff
+
+
+CARD_SIZE = (856, 540)  # CR80 ID card at ~254 DPI
+
+
+def aadhaar_number(rng: random.Random) -> str:
+    """Random 12-digit number with a valid Verhoeff check digit (never a real, issued Aadhaar)."""
+    body = str(rng.randint(2, 9)) + "".join(str(rng.randint(0, 9)) for _ in range(10))
+    for check in "0123456789":
+        if verhoeff.checksum(body + check) == 0:
+            return body + check
+
+
+def pan_number(rng: random.Random) -> str:
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    return "".join(rng.choice(letters) for _ in range(5)) + f"{rng.randint(0, 9999):04d}" + rng.choice(letters)
+
+
+def dl_number(rng: random.Random) -> str:
+    return rng.choice(["MH", "DL", "KA", "TN"]) + "".join(str(rng.randint(0, 9)) for _ in range(13))
+
+
+def epic_number(rng: random.Random) -> str:
+    return "".join(rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3)) + f"{rng.randint(0, 9999999):07d}"
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+class SyntheticCard:
+    """A rendered ID card plus its ground truth: the number and an OCR page with word boxes."""
+
+    def __init__(self, image, number: str, page: dict, rotation: int):
+        self.image = image
+        self.number = number
+        self.page = page
+        self.rotation = rotation
+
+
+def render_card(kind: str = "aadhaar", rng: random.Random = None, rotation: int = 0) -> SyntheticCard:
+    """Draw a fake `kind` card ("aadhaar", "pan", "dl" or "epic"), rotated by a multiple of 90 degrees."""
+    rng = rng or random.Random(0)
+    number = {"aadhaar": aadhaar_number, "pan": pan_number, "dl": dl_number, "epic": epic_number}[kind](rng)
+    shown = " ".join(number[i:i + 4] for i in range(0, 12, 4)) if kind == "aadhaar" else number
+    lines = [
+        (f"GOVERNMENT OF INDIA {kind.upper()}", 26),
+        ("Name: Test Holder", 24),
+        (f"DOB: {rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1950, 2005)}", 24),
+        ("MALE", 24),
+        (shown, 44),
+    ]
+
+    img = Image.new("RGB", CARD_SIZE, "white")
+    draw = ImageDraw.Draw(img)
+    words = []
+    y = 40
+    for text, size in lines:
+        font = _font(size)
+        x = 60
+        for word in text.split(" "):
+            x0, y0, x1, y1 = draw.textbbox((x, y), word, font=font)
+            draw.text((x, y), word, fill="black", font=font)
+            words.append({"content": word, "bbox": [x0, y0, x1, y1]})
+            x = x1 + size // 2
+        y += size + 40
+
+    page = {"lines": [{"content": text} for text, _ in lines], "words": words}
+    for _ in range((rotation // 90) % 4):
+        img = img.transpose(Image.ROTATE_270)  # 90 degrees clockwise; new width is the old height
+        for word in page["words"]:
+            x0, y0, x1, y1 = word["bbox"]
+            word["bbox"] = [img.width - y1, x0, img.width - y0, x1]
+    return SyntheticCard(img, number, page, rotation)
+
+
+def card_pdf(cards: list, dpi: int = 100) -> bytes:
+    """A PDF with one scanned-looking page per card; rendering it at `dpi` reproduces the card pixels."""
+    doc = fitz.open()
+    for card in cards:
+        width, height = card.image.size
+        page = doc.new_page(width=width * 72 / dpi, height=height * 72 / dpi)
+        buffered = BytesIO()
+        card.image.save(buffered, format="PNG")
+        page.insert_image(page.rect, stream=buffered.getvalue())
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+def card_tiff(cards: list) -> bytes:
+    """A multi-frame TIFF with one frame per card."""
+    buffered = BytesIO()
+    cards[0].image.save(buffered, format="TIFF", save_all=True, append_images=[c.image for c in cards[1:]])
+    return buffered.getvalue()
+
+
+def bundle(pages: int, aadhaar_page: int, rng: random.Random = None) -> list:
+    """Cards for a scanned bundle: filler PAN/DL/EPIC pages with the Aadhaar card at `aadhaar_page`."""
+    rng = rng or random.Random(0)
+    kinds = ["pan", "dl", "epic"]
+    return [render_card("aadhaar" if i == aadhaar_page else kinds[i % 3], rng) for i in range(pages)]
@@ -0,0 +1,93 @@
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aadhar_masking_app"))
+
+import verhoeff
+
+
+def valid_number(body: str) -> str:
+    """`body` (11 digits) plus the Verhoeff check digit that makes it valid."""
+    return next(body + check for check in "0123456789" if verhoeff.checksum(body + check) == 0)
+
+
+class FakeClient:
+    """Answers every model call with the same OCR page and counts the calls."""
+
+    def __init__(self, page: dict):
+        self.page = page
+        self.calls = 0
+
+    def submit(self, model, messages, **options):
+        self.calls += 1
+        future = Future()
+        future.set_result({"message": {"role": "assistant", "content": json.dumps(self.page)}})
+        return future
+
+
+class StubOllama:
+    """Minimal Ollama /api/chat server on a local port, recording requests and peak concurrency.
+
+    `reply(payload)` builds the assistant message content; by default it echoes the last message.
+    """
+
+    def __init__(self, delay: float = 0.0, reply=None):
+        self.delay = delay
+        self.reply = reply or (lambda payload: payload["messages"][-1]["content"] if payload["messages"] else "")
+        self.requests = []
+        self.active = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                with stub._lock:
+                    stub.requests.append(payload)
+                    stub.active += 1
+                    stub.peak = max(stub.peak, stub.active)
+                try:
+                    time.sleep(stub.delay)
+                    if self.path != "/api/chat":
+                        self.send_response(404)
+                        self.end_headers()
+                        return
+                    body = json.dumps({
+                        "model": payload["model"],
+                        "message": {"role": "assistant", "content": stub.reply(payload)},
+                        "done": True,
+                    }).encode()
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def ollama_stub():
+    stub = StubOllama(delay=0.05)
+    yield stub
+    stub.close()
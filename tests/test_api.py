@@ -0,0 +1,289 @@
+import os
+import sys
+import importlib
+import subprocess
+from io import BytesIO
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+@pytest.fixture(params=["thread"])
+def api(request, tmp_path, monkeypatch):
+    monkeypatch.setenv("MASK_JOBS_DIR", str(tmp_path / "jobs"))
+    monkeypatch.setenv("MASK_WARMUP", "0")
+    monkeypatch.setenv("MASK_EXECUTOR", request.param)
+    import jobs
+    import main
+    importlib.reload(jobs)
+    main = importlib.reload(main)
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+def test_request_latency_is_labelled_by_route_template(api):
+    from prometheus_client import REGISTRY
+    main, client = api
+
+    for job_id in ("a" * 32, "b" * 32):
+        assert client.get(f"/jobs/{job_id}").status_code == 404
+    client.get("/no-such-endpoint")
+
+    assert REGISTRY.get_sample_value(
+        "aadhaar_request_seconds_count", {"endpoint": "/jobs/{job_id}", "status": "404"}
+    ) >= 2
+    assert REGISTRY.get_sample_value(
+        "aadhaar_request_seconds_count", {"endpoint": "/jobs/" + "a" * 32, "status": "404"}
+    ) is None
+    assert REGISTRY.get_sample_value("aadhaar_request_seconds_count", {"endpoint": "other", "status": "404"}) >= 1
+
+
+def test_api_import_leaves_the_imaging_libraries_to_the_workers(tmp_path):
+    app_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "aadhar_masking_app")
+    code = "import sys, main; print(sorted(m for m in ('numpy', 'PIL', 'fitz', 'cv2') if m in sys.modules))"
+    env = {**os.environ, "MASK_JOBS_DIR": str(tmp_path / "jobs")}
+    loaded = subprocess.run([sys.executable, "-c", code], cwd=app_dir, env=env, capture_output=True, text=True, check=True)
+    assert loaded.stdout.strip() == "[]"
+
+
+def test_image_too_large_to_decode_is_rejected(api, monkeypatch):
+    from masking import AadharMask
+    _, client = api
+    monkeypatch.setattr(AadharMask, "MEMORY_BUDGET", 10_000)
+    buffered = BytesIO()
+    Image.new("RGB", (100, 100), "white").save(buffered, format="PNG")
+
+    response = client.post("/mask-aadhar", files={"file": ("big.png", buffered.getvalue(), "image/png")})
+    assert response.status_code == 413
+    assert "budget" in response.json()["detail"]
+
+
+def test_large_image_output_is_streamed_from_disk_and_removed(api, tmp_path, monkeypatch):
+    import base64
+    import tempfile
+    import workers
+    from masking import AadharMask
+    from conftest import FakeClient
+    _, client = api
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    monkeypatch.setattr(tempfile, "tempdir", str(spool))
+    monkeypatch.setattr(AadharMask, "MEMORY_BUDGET", 1_000_000)
+    monkeypatch.setattr(AadharMask, "TILE_SIZE", 400)
+    monkeypatch.setattr(workers, "get_masker", lambda: AadharMask(client=FakeClient({"words": []})))
+    buffered = BytesIO()
+    Image.new("RGB", (700, 200), "white").save(buffered, format="PNG")
+    upload = {"file": ("big.png", buffered.getvalue(), "image/png")}
+
+    response = client.post("/mask-aadhar", files=upload)
+    assert int(response.headers["content-length"]) == len(response.content)
+    body = response.json()
+    with Image.open(BytesIO(base64.b64decode(body["base64_output"]))) as masked:
+        assert masked.size == (700, 200)
+    assert body["comments"] == ["No Aadhaar number detected"]
+
+    response = client.post("/mask-aadhar?format=binary", files=upload)
+    assert response.headers["content-type"] == "image/png"
+    assert int(response.headers["content-length"]) == len(response.content)
+    assert response.content == base64.b64decode(body["base64_output"])
+    assert list(spool.iterdir()) == []
+
+
+def test_cache_stats_come_from_the_pool_workers(api):
+    _, client = api
+    response = client.get("/cache/stats")
+    assert response.status_code == 200
+    assert response.json()["hits"] == 0
+
+
+@pytest.mark.parametrize("api", ["process"], indirect=True)
+def test_cache_stats_are_not_served_by_the_process_executor_api(api):
+    _, client = api
+    assert client.get("/cache/stats").status_code == 404
+
+
+def png_bytes(size=(640, 200)) -> bytes:
+    buffered = BytesIO()
+    Image.new("RGB", size, "white").save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_job_lifecycle(api, monkeypatch):
+    import jobs
+    import workers
+    from masking import AadharMask
+    from conftest import FakeClient
+    from test_masking import number_words
+    main, client = api
+    monkeypatch.setattr(workers, "get_masker", lambda: AadharMask(client=FakeClient({"words": number_words()})))
+
+    submitted = client.post("/jobs", files={"file": ("card.png", png_bytes(), "image/png")})
+    assert submitted.status_code == 202
+    job_id = submitted.json()["id"]
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "queued"
+    assert client.get(f"/jobs/{job_id}/result").status_code == 409
+
+    job = main.job_store.claim(os.getpid())
+    assert job["id"] == job_id
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "running"
+    jobs.process_job(main.job_store, job)
+
+    status = client.get(f"/jobs/{job_id}").json()
+    assert status["status"] == "done"
+    assert (status["pages_done"], status["pages_total"]) == (1, 1)
+    assert status["comments"] == ["Aadhaar masked successfully"]
+    result = client.get(f"/jobs/{job_id}/result")
+    assert result.headers["content-type"] == "image/png"
+    assert result.headers["x-aadhaar-valid"] == "true"
+    with Image.open(BytesIO(result.content)) as masked:
+        assert masked.getpixel((120, 110)) == (255, 165, 0)
+
+    assert client.delete(f"/jobs/{job_id}").status_code == 204
+    assert client.get(f"/jobs/{job_id}").status_code == 404
+    assert not os.listdir(os.path.join(main.job_store.root, "files"))
+
+
+def test_failed_masking_fails_the_job(api, monkeypatch):
+    import jobs
+    import workers
+    main, client = api
+
+    class Broken:
+        def mask_aadhar_final(self, *args, **kwargs):
+            raise RuntimeError("engine crashed")
+
+    monkeypatch.setattr(workers, "get_masker", lambda: Broken())
+    job_id = client.post("/jobs", files={"file": ("card.png", png_bytes(), "image/png")}).json()["id"]
+    jobs.process_job(main.job_store, main.job_store.claim(os.getpid()))
+
+    status = client.get(f"/jobs/{job_id}").json()
+    assert status["status"] == "failed"
+    assert status["error"] == "Processing failed: engine crashed"
+
+
+def test_orphaned_jobs_are_requeued_until_max_attempts(api):
+    import jobs
+    main, client = api
+    store = main.job_store
+    upload = {"file": ("card.png", png_bytes(), "image/png")}
+    job_id = client.post("/jobs", files=upload).json()["id"]
+
+    for attempt in range(1, jobs.MAX_ATTEMPTS + 1):
+        assert store.claim(dead_pid())["id"] == job_id
+        requeued = store.requeue_orphans()
+        status = client.get(f"/jobs/{job_id}").json()
+        if attempt < jobs.MAX_ATTEMPTS:
+            assert (requeued, status["status"]) == (1, "queued")
+        else:
+            assert (requeued, status["status"]) == (0, "failed")
+            assert status["error"] == f"Worker exited during processing {jobs.MAX_ATTEMPTS} times"
+
+    job_id = client.post("/jobs", files=upload).json()["id"]
+    store.claim(os.getpid())
+    assert store.requeue_orphans() == 0  # Its worker (this process) is still alive
+    assert client.get(f"/jobs/{job_id}").json()["status"] == "running"
+
+
+def use_fake_masker(monkeypatch, page: dict):
+    import workers
+    from masking import AadharMask
+    from conftest import FakeClient
+    monkeypatch.setattr(workers, "get_masker", lambda: AadharMask(client=FakeClient(page)))
+
+
+def test_negotiate_orders_by_q_value(api):
+    main, _ = api
+    assert main.negotiate("application/pdf;q=0.1, application/json", "application/pdf") == "json"
+    assert main.negotiate("application/json;q=0.5, image/png", "image/png") == "binary"
+    assert main.negotiate("multipart/mixed, application/json", "image/png") == "multipart"
+    assert main.negotiate("image/png;q=0, application/octet-stream;q=0.2", "image/png") == "binary"
+    assert main.negotiate("image/png;q=0", "image/png") == "json"
+    assert main.negotiate("image/png", "application/pdf") == "json"
+    assert main.negotiate(None, "image/png") == "json"
+
+
+def test_binary_response_carries_results_in_headers(api, monkeypatch):
+    import json
+    from test_masking import number_words
+    _, client = api
+    use_fake_masker(monkeypatch, {"words": number_words()})
+
+    response = client.post(
+        "/mask-aadhar", files={"file": ("my card.png", png_bytes(), "image/png")}, headers={"Accept": "image/png"}
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/png"
+    assert response.headers["content-disposition"] == 'attachment; filename="masked_my_card.png"'
+    assert response.headers["x-aadhaar-valid"] == "true"
+    assert response.headers["x-aadhaar-summary"] == "Aadhaar masking completed"
+    assert json.loads(response.headers["x-aadhaar-comments"]) == ["Aadhaar masked successfully"]
+    assert int(response.headers["content-length"]) == len(response.content)
+    with Image.open(BytesIO(response.content)) as masked:
+        assert masked.getpixel((120, 110)) == (255, 165, 0)
+
+
+def test_multipart_response_has_results_then_file(api, monkeypatch):
+    import json
+    _, client = api
+    use_fake_masker(monkeypatch, {"words": []})
+
+    response = client.post("/mask-aadhar?format=multipart", files={"file": ("card.png", png_bytes(), "image/png")})
+
+    assert response.status_code == 200
+    content_type, boundary = response.headers["content-type"].split("; boundary=")
+    assert content_type == "multipart/mixed"
+    assert int(response.headers["content-length"]) == len(response.content)
+    parts = response.content.split(f"--{boundary}".encode())
+    assert parts[0] == b"" and parts[-1] == b"--\r\n"
+    json_head, json_body = parts[1].strip(b"\r\n").split(b"\r\n\r\n", 1)
+    assert json_head == b"Content-Type: application/json"
+    assert json.loads(json_body) == {
+        "valid": False, "comments": ["No Aadhaar number detected"], "summary": "Invalid or no Aadhaar detected"
+    }
+    file_head, file_body = parts[2][2:].split(b"\r\n\r\n", 1)
+    assert b"Content-Type: image/png" in file_head
+    with Image.open(BytesIO(file_body[:-2])) as masked:
+        assert masked.size == (640, 200)
+
+
+def test_batch_reports_each_file(api, monkeypatch):
+    import base64
+    _, client = api
+    use_fake_masker(monkeypatch, {"words": []})
+    files = [
+        ("files", ("a.png", png_bytes(), "image/png")),
+        ("files", ("notes.txt", b"hello", "text/plain")),
+        ("files", ("broken.png", b"not a png", "image/png")),
+    ]
+
+    body = client.post("/mask-aadhar/batch", files=files).json()
+
+    assert body["count"] == 3
+    ok, unsupported, broken = body["results"]
+    assert (ok["index"], ok["filename"], ok["status"]) == (0, "a.png", "ok")
+    assert ok["result"]["comments"] == ["No Aadhaar number detected"]
+    with Image.open(BytesIO(base64.b64decode(ok["result"]["base64_output"]))) as masked:
+        assert masked.size == (640, 200)
+    assert unsupported == {"index": 1, "filename": "notes.txt", "status": "error", "detail": "Unsupported file type"}
+    assert broken["status"] == "error" and broken["detail"].startswith("Processing failed")
+
+
+def test_batch_streams_ndjson(api, monkeypatch):
+    import json
+    _, client = api
+    use_fake_masker(monkeypatch, {"words": []})
+    files = [("files", (f"{i}.png", png_bytes(), "image/png")) for i in range(3)]
+
+    response = client.post("/mask-aadhar/batch?stream=true&concurrency=2", files=files)
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    entries = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(entry["index"] for entry in entries) == [0, 1, 2]
+    assert all(entry["status"] == "ok" for entry in entries)
@@ -0,0 +1,73 @@
+import pytest
+import cache
+from cache import OCRCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A settable cache clock, so TTLs and access order do not depend on real time."""
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    return now
+
+
+def test_make_key_depends_on_pixels_model_and_prompt():
+    key = OCRCache.make_key(b"pixels", "model", "prompt")
+    assert key == OCRCache.make_key(b"pixels", "model", "prompt")
+    assert key != OCRCache.make_key(b"pixelz", "model", "prompt")
+    assert key != OCRCache.make_key(b"pixels", "other", "prompt")
+    assert key != OCRCache.make_key(b"pixels", "model", "")
+
+
+def test_memory_tier_evicts_least_recently_used(clock):
+    ocr_cache = OCRCache(max_entries=2)
+    ocr_cache.set("a", 1)
+    ocr_cache.set("b", 2)
+    assert ocr_cache.get("a") == 1  # "b" is now the least recently used
+    ocr_cache.set("c", 3)
+
+    assert ocr_cache.get("b") is None
+    assert (ocr_cache.get("a"), ocr_cache.get("c")) == (1, 3)
+    stats = ocr_cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"], stats["memory_entries"]) == (3, 1, 1, 2)
+    assert stats["disk_entries"] is None
+
+
+def test_entries_expire_after_ttl(clock, tmp_path):
+    ocr_cache = OCRCache(db_path=str(tmp_path / "cache.db"), ttl=60)
+    ocr_cache.set("a", {"words": []})
+    clock[0] += 59
+    assert ocr_cache.get("a") == {"words": []}
+    clock[0] += 2
+    assert ocr_cache.get("a") is None
+    assert ocr_cache.stats()["disk_entries"] == 0  # Expired rows are deleted, not just skipped
+
+
+def test_disk_tier_survives_memory_eviction_and_restarts(clock, tmp_path):
+    path = str(tmp_path / "cache.db")
+    ocr_cache = OCRCache(max_entries=1, db_path=path)
+    ocr_cache.set("a", [1])
+    ocr_cache.set("b", [2])  # Pushes "a" out of memory, not off disk
+
+    assert ocr_cache.get("a") == [1]
+    assert ocr_cache.stats()["disk_hits"] == 1
+    ocr_cache.close()
+
+    reopened = OCRCache(db_path=path)
+    assert (reopened.get("a"), reopened.get("b")) == ([1], [2])
+    assert reopened.stats()["disk_hits"] == 2
+
+
+def test_disk_tier_evicts_least_recently_accessed(clock, tmp_path):
+    ocr_cache = OCRCache(max_entries=1, db_path=str(tmp_path / "cache.db"), max_disk_entries=2)
+    ocr_cache.set("a", 1)
+    clock[0] += 1
+    ocr_cache.set("b", 2)
+    clock[0] += 1
+    assert ocr_cache.get("a") == 1  # Read from disk, refreshing its access time past "b"
+    clock[0] += 1
+    ocr_cache.set("c", 3)
+
+    assert ocr_cache.stats()["disk_entries"] == 2
+    assert ocr_cache.get("b") is None
+    assert (ocr_cache.get("a"), ocr_cache.get("c")) == (1, 3)
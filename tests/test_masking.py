@@ -0,0 +1,145 @@
+import os
+from io import BytesIO
+import fitz
+from PIL import Image
+from masking import AadharMask
+from conftest import valid_number, FakeClient
+
+
+NUMBER = valid_number("23456789012")
+GROUPED = f"{NUMBER[:4]} {NUMBER[4:8]} {NUMBER[8:]}"
+
+
+def number_words(x0=100, y0=100):
+    return [{"content": group, "bbox": [x0 + i * 60, y0, x0 + i * 60 + 50, y0 + 20]}
+            for i, group in enumerate(GROUPED.split())]
+
+
+def test_text_layer_on_rotated_page_is_redacted():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 100), f"Name Ramesh Kumar Aadhaar {GROUPED}", fontsize=12)
+    page.set_rotation(90)
+    client = FakeClient({"words": []})
+
+    result = AadharMask(client=client).mask_aadhar_final(doc.tobytes(), file_ext=".pdf", raw_output=True)
+
+    assert client.calls == 0
+    assert result["comments"] == ["Aadhaar masked successfully"]
+    text = fitz.open(stream=result["output"], filetype="pdf")[0].get_text()
+    assert NUMBER[:4] not in text and NUMBER[4:8] not in text
+    assert NUMBER[8:] in text
+
+
+def test_scanned_page_with_text_footer_falls_back_to_ocr():
+    scan = Image.new("RGB", (800, 500), "white")
+    buffered = BytesIO()
+    scan.save(buffered, format="PNG")
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_image(fitz.Rect(50, 50, 450, 300), stream=buffered.getvalue())
+    page.insert_text((72, 800), "Scanned with CamScanner on 12 Oct 2024", fontsize=8)
+    client = FakeClient({"words": number_words()})
+
+    result = AadharMask(client=client).mask_aadhar_final(doc.tobytes(), file_ext=".pdf")
+
+    assert client.calls == 1
+    assert result["comments"] == ["Aadhaar masked successfully"]
+
+
+def test_text_only_page_skips_the_model():
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 100), "Statement of account for the month of October", fontsize=12)
+    client = FakeClient({"words": number_words()})
+
+    result = AadharMask(client=client).mask_aadhar_final(doc.tobytes(), file_ext=".pdf")
+
+    assert client.calls == 0
+    assert result["comments"] == ["No Aadhaar number detected"]
+
+
+def pan_card_png() -> bytes:
+    from PIL import ImageDraw, ImageFont
+    img = Image.new("RGB", (856, 540), "white")
+    ImageDraw.Draw(img).text((60, 250), "ABCDE1234F", fill="black", font=ImageFont.load_default(size=40))
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return buffered.getvalue()
+
+
+def test_confident_region_crops_without_a_number_are_not_retried():
+    from regions import NumberRegionDetector
+    pan_page = {"words": [{"content": "ABCDE1234F", "bbox": [10, 10, 200, 40]}]}
+
+    client = FakeClient(pan_page)
+    masker = AadharMask(client=client, region_detector=NumberRegionDetector(min_confidence=0.0))
+    result = masker.mask_aadhar_final(pan_card_png(), file_ext=".png")
+    assert client.calls == 1
+    assert result["comments"] == ["No Aadhaar number detected"]
+
+    client = FakeClient(pan_page)
+    masker = AadharMask(client=client, region_detector=NumberRegionDetector(min_confidence=1.0))
+    masker.mask_aadhar_final(pan_card_png(), file_ext=".png")
+    assert client.calls == 2
+
+
+def test_valid_number_without_boxes_is_not_reported_as_masked():
+    client = FakeClient({"lines": [{"content": f"Aadhaar {GROUPED}"}]})
+
+    result = AadharMask(client=client).mask_aadhar_final(pan_card_png(), file_ext=".png")
+
+    assert result["valid"] is False
+    assert result["comments"] == ["Aadhaar detected but its position is unknown, not masked"]
+
+
+def test_region_cropped_page_is_matched_once():
+    from prometheus_client import REGISTRY
+    from regions import NumberRegionDetector
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0.0
+
+    bad = NUMBER[:11] + str((int(NUMBER[11]) + 1) % 10)
+    client = FakeClient({"words": [{"content": bad, "bbox": [10, 10, 200, 40]}]})
+    masker = AadharMask(client=client, region_detector=NumberRegionDetector(min_confidence=1.0))
+    failures = sample("aadhaar_checksum_failures_total")
+    matches = sample("aadhaar_stage_seconds_count", stage="match")
+
+    result = masker.mask_aadhar_final(pan_card_png(), file_ext=".png")
+
+    assert result["comments"] == ["Checksum failed, invalid Aadhaar detected"]
+    assert client.calls == 1
+    assert sample("aadhaar_checksum_failures_total") - failures == 1
+    assert sample("aadhaar_stage_seconds_count", stage="match") - matches == 1
+
+
+
+class FirstCallClient(FakeClient):
+    """Answers the first model call with `page` and every later one with an empty page."""
+
+    def submit(self, model, messages, **options):
+        future = super().submit(model, messages, **options)
+        self.page = {"words": []}
+        return future
+
+
+def test_large_image_is_masked_tile_by_tile_into_a_file(monkeypatch):
+    monkeypatch.setattr(AadharMask, "MEMORY_BUDGET", 1_000_000)
+    monkeypatch.setattr(AadharMask, "TILE_SIZE", 400)
+    monkeypatch.setattr(AadharMask, "TILE_OVERLAP", 100)
+    buffered = BytesIO()
+    Image.new("RGB", (700, 200), "white").save(buffered, format="PNG")
+
+    result = AadharMask(client=FirstCallClient({"words": number_words()})).mask_aadhar_final(
+        buffered.getvalue(), file_ext=".png"
+    )
+
+    assert result["comments"] == ["Aadhaar masked successfully"]
+    assert "base64_output" not in result and result["media_type"] == "image/png"
+    try:
+        with Image.open(result["output_path"]) as masked:
+            assert masked.size == (700, 200)
+            assert masked.getpixel((120, 110)) == (255, 165, 0)  # First group masked
+            assert masked.getpixel((240, 110)) == (255, 255, 255)  # Last group left visible
+    finally:
+        os.remove(result["output_path"])
@@ -0,0 +1,58 @@
+import matcher
+from conftest import valid_number
+
+
+NUMBER = valid_number("23456789012")
+
+
+def words(*items):
+    return {"words": [{"content": text, "bbox": list(bbox)} for text, bbox in items]}
+
+
+def test_grouped_number_masks_first_two_groups():
+    page = words(("Aadhaar", (0, 0, 70, 10)), (NUMBER[:4], (100, 0, 140, 10)),
+                 (NUMBER[4:8], (150, 0, 190, 10)), (NUMBER[8:], (200, 0, 240, 10)))
+    spans, candidates = matcher.match_page(page)
+    assert candidates == 1
+    assert [span["number"] for span in spans] == [NUMBER]
+    assert spans[0]["token_indexes"] == [1, 2, 3]
+    assert spans[0]["boxes"] == [(100, 0, 140, 10), (150, 0, 190, 10)]
+
+
+def test_single_token_is_cut_at_character_level():
+    page = words((NUMBER, (0, 0, 120, 10)))
+    spans, _ = matcher.match_page(page)
+    assert spans[0]["boxes"] == [(0, 0, 80, 10)]
+
+
+def test_lines_are_split_into_tokens():
+    content = f"{NUMBER[:4]} {NUMBER[4:8]} {NUMBER[8:]}"
+    page = {"lines": [{"content": content, "bbox": [0, 0, len(content) * 10, 10]}]}
+    spans, _ = matcher.match_page(page)
+    assert spans[0]["boxes"] == [(0, 0, 40, 10), (50, 0, 90, 10)]
+
+
+def test_invalid_checksum_is_a_candidate_but_not_a_span():
+    bad = NUMBER[:11] + str((int(NUMBER[11]) + 1) % 10)
+    spans, candidates = matcher.match_page(words((bad, (0, 0, 120, 10))))
+    assert spans == []
+    assert candidates == 1
+
+
+def test_number_split_across_lines_and_confusions():
+    page = words((NUMBER[:6], (0, 0, 60, 10)), (NUMBER[6:].replace("0", "O"), (0, 20, 60, 30)))
+    spans, _ = matcher.match_page(page)
+    assert [span["number"] for span in spans] == [NUMBER]
+    assert spans[0]["boxes"] == [(0, 0, 60, 10), (0, 20, 20, 30)]
+
+
+def test_span_without_positions_has_no_boxes():
+    page = {"lines": [{"content": f"{NUMBER[:4]} {NUMBER[4:8]} {NUMBER[8:]}"}]}
+    spans, _ = matcher.match_page(page)
+    assert [span["number"] for span in spans] == [NUMBER]
+    assert spans[0]["boxes"] == []
+
+    # One masked group without a box would leave its digits readable
+    page = {"words": [{"content": NUMBER[:4]}, {"content": NUMBER[4:8], "bbox": [50, 0, 90, 10]},
+                      {"content": NUMBER[8:], "bbox": [100, 0, 140, 10]}]}
+    assert matcher.match_page(page)[0][0]["boxes"] == []
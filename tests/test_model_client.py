@@ -0,0 +1,48 @@
+import httpx
+import pytest
+from model_client import ModelClient
+
+
+def test_chat_posts_to_api_chat(ollama_stub):
+    client = ModelClient(host=ollama_stub.url, keep_alive="5m")
+    try:
+        response = client.chat("llama3.2-vision", [{"role": "user", "content": "hello"}], format="json")
+    finally:
+        client.close()
+    assert response["message"]["content"] == "hello"
+    payload = ollama_stub.requests[0]
+    assert payload["model"] == "llama3.2-vision"
+    assert payload["stream"] is False
+    assert payload["keep_alive"] == "5m"
+    assert payload["format"] == "json"
+
+
+def test_chat_many_keeps_order_and_respects_max_concurrency(ollama_stub):
+    client = ModelClient(host=ollama_stub.url, max_concurrency=2)
+    requests = [("m", [{"role": "user", "content": str(i)}], None) for i in range(8)]
+    try:
+        responses = client.chat_many(requests)
+    finally:
+        client.close()
+    assert [r["message"]["content"] for r in responses] == [str(i) for i in range(8)]
+    assert ollama_stub.peak == 2
+
+
+def test_preload_sends_empty_chat(ollama_stub):
+    client = ModelClient(host=ollama_stub.url, keep_alive="-1")
+    try:
+        client.preload("llama3.2-vision")
+    finally:
+        client.close()
+    assert ollama_stub.requests == [
+        {"model": "llama3.2-vision", "messages": [], "stream": False, "keep_alive": -1}
+    ]
+
+
+def test_http_errors_raise(ollama_stub):
+    client = ModelClient(host=ollama_stub.url + "/missing")
+    try:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.chat("m", [{"role": "user", "content": "x"}])
+    finally:
+        client.close()
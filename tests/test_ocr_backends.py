@@ -0,0 +1,43 @@
+import pytest
+import ocr_backends
+from conftest import valid_number
+
+
+NUMBER = valid_number("23456789012")
+
+
+class FixedBackend(ocr_backends.OCRBackend):
+    def __init__(self, name, cost, page):
+        self.name = name
+        self.cost = cost
+        self.page = page
+        self.calls = 0
+
+    def recognize(self, img):
+        self.calls += 1
+        return dict(self.page)
+
+
+def number_page(confidence):
+    return {"words": [{"content": group, "bbox": [i * 60, 0, i * 60 + 50, 20], "confidence": confidence}
+                      for i, group in enumerate([NUMBER[:4], NUMBER[4:8], NUMBER[8:]])]}
+
+
+def test_router_escalates_cheapest_first_until_accepted():
+    cheap = FixedBackend("cheap", 1, number_page(0.5))
+    better = FixedBackend("better", 2, number_page(0.95))
+    unused = FixedBackend("unused", 3, number_page(0.99))
+    router = ocr_backends.OCRRouter([unused, better, cheap], min_confidence=0.8)
+
+    page, accepted = router.cascade(None)
+
+    assert accepted and page["source"] == "better"
+    assert (cheap.calls, better.calls, unused.calls) == (1, 1, 0)
+
+
+def test_router_from_env_rejects_the_model(monkeypatch):
+    monkeypatch.setenv("MASK_OCR_BACKENDS", "tesseract,llm")
+    with pytest.raises(ValueError, match="llm"):
+        ocr_backends.router_from_env()
+    monkeypatch.delenv("MASK_OCR_BACKENDS")
+    assert ocr_backends.router_from_env() is None
@@ -0,0 +1,86 @@
+from io import BytesIO
+import pytest
+import numpy as np
+from PIL import Image
+import matcher
+import tiling
+from conftest import valid_number
+
+
+NUMBER = valid_number("23456789012")
+
+
+def test_tile_cores_cover_each_pixel_once():
+    grid = tiling.tile_grid(1000, 700, 400, 100)
+    for x in range(0, 1000, 7):
+        for y in range(0, 700, 7):
+            owners = [core for box, core in grid if core[0] <= x < core[2] and core[1] <= y < core[3]]
+            assert len(owners) == 1
+    for (x0, y0, x1, y1), (cx0, cy0, cx1, cy1) in grid:
+        assert x0 <= cx0 < cx1 <= x1 and y0 <= cy0 < cy1 <= y1
+
+
+def test_merge_drops_overlap_duplicates_and_edge_fragments():
+    # Two tiles side by side, overlapping on x 300..400; the middle group sits in the overlap
+    # and is seen by both, the last group is cut off at the first tile's right edge.
+    (box_a, core_a), (box_b, core_b) = tiling.tile_grid(700, 100, 400, 100)
+    groups = [(NUMBER[:4], 240, 290), (NUMBER[4:8], 320, 370), (NUMBER[8:], 390, 440)]
+    page_a = {"words": [{"content": "Aadhaar", "bbox": [100, 40, 200, 60]}]}
+    page_b = {"words": []}
+    for text, x0, x1 in groups:
+        if x0 < box_a[2]:
+            visible = text if x1 <= box_a[2] else text[:2]
+            page_a["words"].append({"content": visible, "bbox": [x0, 40, min(x1, box_a[2]), 60]})
+        if x1 > box_b[0]:
+            visible = text if x0 >= box_b[0] else text[2:]
+            left = max(x0, box_b[0])
+            page_b["words"].append({"content": visible, "bbox": [left - box_b[0], 40, x1 - box_b[0], 60]})
+
+    merged = tiling.merge_tile_pages([(page_a, box_a, core_a), (page_b, box_b, core_b)])
+
+    assert [w["content"] for w in merged["words"]] == ["Aadhaar", NUMBER[:4], NUMBER[4:8], NUMBER[8:]]
+    assert merged["lines"][0]["content"] == f"Aadhaar {NUMBER[:4]} {NUMBER[4:8]} {NUMBER[8:]}"
+    spans, _ = matcher.match_page(merged)
+    assert spans[0]["boxes"] == [(240, 40, 290, 60), (320, 40, 370, 60)]
+
+
+def test_png_writer_round_trip():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, size=(37, 23, 3), dtype=np.uint8)
+    buffered = BytesIO()
+    writer = tiling.PNGWriter(buffered, 23, 37)
+    for y0 in range(0, 37, 10):
+        writer.write(pixels[y0:y0 + 10])
+    writer.close()
+    with Image.open(BytesIO(buffered.getvalue())) as img:
+        assert img.size == (23, 37)
+        assert np.array_equal(np.asarray(img.convert("RGB")), pixels)
+
+
+def test_tiled_image_reads_regions():
+    rng = np.random.default_rng(1)
+    pixels = rng.integers(0, 256, size=(50, 80, 3), dtype=np.uint8)
+    for fmt in ("PPM", "PNG"):
+        buffered = BytesIO()
+        Image.fromarray(pixels).save(buffered, format=fmt)
+        reader = tiling.TiledImage(buffered.getvalue())
+        try:
+            assert (reader.width, reader.height) == (80, 50)
+            with reader.read((10, 5, 60, 45)) as region:
+                assert np.array_equal(np.asarray(region), pixels[5:45, 10:60])
+        finally:
+            reader.close()
+
+
+def test_check_rejects_compressed_frames_over_budget():
+    pixels = np.zeros((50, 80, 3), dtype=np.uint8)
+    for fmt, fits in (("PPM", True), ("PNG", False)):
+        buffered = BytesIO()
+        Image.fromarray(pixels).save(buffered, format=fmt)
+        data = buffered.getvalue()
+        with Image.open(BytesIO(data)) as img:
+            if fits:
+                tiling.TiledImage.check(img, data, 1000)
+            else:
+                with pytest.raises(tiling.ImageTooLarge):
+                    tiling.TiledImage.check(img, data, 1000)
@@ -0,0 +1,44 @@
+import random
+import numpy as np
+import verhoeff
+from conftest import valid_number
+
+
+def test_checksum_known_values():
+    assert verhoeff.checksum("2363") == 0
+    assert verhoeff.checksum("2364") != 0
+
+
+def test_validate_batch_matches_checksum():
+    rng = random.Random(0)
+    numbers = ["".join(rng.choice("0123456789") for _ in range(12)) for _ in range(2000)]
+    expected = [verhoeff.checksum(n) == 0 for n in numbers]
+    assert verhoeff.validate_batch(numbers).tolist() == expected
+    digits = np.array([[int(d) for d in n] for n in numbers])
+    assert verhoeff.validate_batch(digits).tolist() == expected
+    assert verhoeff.validate_batch([]).shape == (0,)
+
+
+def test_repair_digits():
+    assert verhoeff.repair_digits("1234 5678") == "12345678"
+    assert verhoeff.repair_digits("l2O4") == "1204"
+
+
+def test_letter_only_runs_are_not_candidates():
+    rng = random.Random(0)
+    texts = [" ".join("".join(rng.choice("OolIiSsBD|") for _ in range(4)) for _ in range(3)) for _ in range(2000)]
+    assert verhoeff.find_valid_numbers(texts) == [[] for _ in texts]
+    assert verhoeff.find_candidates("iOII IBll OBiS") == []
+    assert verhoeff.find_candidates("2O4l lB3S 9Oi7") != []
+
+
+def test_find_valid_numbers_repairs_ocr_confusions():
+    number = valid_number("23456789012")
+    garbled = number[:4] + " " + number[4:8].replace("0", "O") + " " + number[8:].replace("1", "l")
+    bad = number[:11] + str((int(number[11]) + 1) % 10)
+    texts = [f"DOB 01/01/1990 {garbled} MALE", f"{bad[:4]} {bad[4:8]} {bad[8:]}", "no numbers here"]
+    results = verhoeff.find_valid_numbers(texts)
+    assert [r[3] for r in results[0]] == [number]
+    assert results[0][0][2] == garbled
+    assert results[1] == []
+    assert results[2] == []
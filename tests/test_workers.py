@@ -0,0 +1,17 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import workers
+
+
+def test_threads_get_their_own_masker_and_share_the_cache():
+    barrier = threading.Barrier(2)  # Both calls must be in flight at once, so they run on different threads
+
+    def build(_):
+        barrier.wait()
+        return workers.get_masker()
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        first, second = pool.map(build, range(2))
+    assert first is not second
+    assert first.cache is second.cache is workers.get_cache()
+    assert workers.get_masker() is workers.get_masker()